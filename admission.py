@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, jsonify, request
+from flask_socketio import emit
+
+import metrics
+
+
+# Admission control: per-IP and per-user token buckets for selected routes
+# (keyed by URL rule) and Socket.IO events (keyed by event name), and global
+# concurrency limits with a bounded wait queue for the Gemini and Firebase
+# paths. Rejections are fast: 429 for a rate limit, 503 once a concurrency
+# limit's queue is full. Every shed request is counted.
+#
+# RATE_LIMITS overrides or adds limits as "name=rate:burst" pairs, rate in
+# requests per second per user, e.g. "/generate_data_ai=0.1:2,submit_answer=5:10";
+# a rate of 0 disables a limit. Per-IP buckets are RATE_LIMIT_IP_FACTOR
+# times larger, since a classroom may share one address.
+DEFAULT_RATE_LIMITS = {
+    '/generate_data_ai': (0.2, 3),
+    '/generate_data_ai/jobs': (0.2, 3),
+    '/add_data': (1, 5),
+    '/signup': (0.2, 5),
+    '/login': (0.5, 10),
+    'submit_answer': (10, 20),
+    'a': (10, 20),
+    'user_joined': (2, 5),
+}
+RATE_LIMIT_IP_FACTOR = float(os.getenv('RATE_LIMIT_IP_FACTOR', '10'))
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '4'))
+GEMINI_MAX_WAITING = int(os.getenv('GEMINI_MAX_WAITING', '8'))
+GEMINI_WAIT_TIMEOUT = float(os.getenv('GEMINI_WAIT_TIMEOUT', '10'))
+FIREBASE_CONCURRENCY = int(os.getenv('FIREBASE_CONCURRENCY', '20'))
+FIREBASE_MAX_WAITING = int(os.getenv('FIREBASE_MAX_WAITING', '100'))
+FIREBASE_WAIT_TIMEOUT = float(os.getenv('FIREBASE_WAIT_TIMEOUT', '5'))
+# Use the first X-Forwarded-For address as the client IP (behind a proxy)
+TRUST_FORWARDED = os.getenv('TRUST_FORWARDED', '').lower() in ('1', 'true', 'yes')
+
+shed_requests = metrics.registry.register(metrics.Counter(
+    'admission_shed_total', 'Requests rejected by admission control', ('name', 'reason')))
+
+
+class Overloaded(Exception):
+    def __init__(self, name):
+        super().__init__(f"{name} is overloaded, try again shortly")
+        self.name = name
+
+
+def parse_limits(spec):
+    limits = {}
+    for item in spec.split(','):
+        name, sep, value = item.strip().rpartition('=')
+        if not name:
+            continue
+        rate, _, burst = value.partition(':')
+        try:
+            limits[name] = (float(rate), float(burst or rate))
+        except ValueError:
+            continue
+    return limits
+
+
+class TokenBuckets:
+    # One bucket per key, refilled lazily on access; full buckets are
+    # dropped periodically so idle clients don't accumulate
+    def __init__(self, rate, burst, prune_interval=60):
+        self.rate = rate
+        self.burst = burst
+        self.prune_interval = prune_interval
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.next_prune = time.monotonic() + prune_interval
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if now >= self.next_prune:
+                self.next_prune = now + self.prune_interval
+                self.buckets = {key: (tokens, last) for key, (tokens, last) in self.buckets.items()
+                                if tokens + (now - last) * self.rate < self.burst}
+            return allowed
+
+
+class RateLimits:
+    def __init__(self, limits=None, ip_factor=RATE_LIMIT_IP_FACTOR):
+        limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        limits.update(parse_limits(os.getenv('RATE_LIMITS', '')))
+        self.buckets = {name: (TokenBuckets(rate * ip_factor, burst * ip_factor), TokenBuckets(rate, burst))
+                        for name, (rate, burst) in limits.items() if rate > 0}
+
+    def check(self, name, ip, user=None):
+        # Returns the rejection reason, or None if the call is admitted
+        buckets = self.buckets.get(name)
+        if buckets is None:
+            return None
+        ip_buckets, user_buckets = buckets
+        if ip and not ip_buckets.allow(ip):
+            reason = 'rate_limited_ip'
+        elif user and not user_buckets.allow(user):
+            reason = 'rate_limited_user'
+        else:
+            return None
+        shed_requests.inc((name, reason))
+        return reason
+
+    def retry_after(self, name):
+        return max(1, round(1 / self.buckets[name][1].rate))
+
+
+class ConcurrencyLimit:
+    # At most `limit` callers inside at once; up to `max_waiting` more wait up
+    # to `timeout` seconds for a slot, anyone beyond that is shed at once
+    def __init__(self, name, limit, max_waiting, timeout):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self.condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.max_waiting:
+                    shed_requests.inc((self.name, 'queue_full'))
+                    raise Overloaded(self.name)
+                self.waiting += 1
+                try:
+                    admitted = self.condition.wait_for(lambda: self.active < self.limit, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    shed_requests.inc((self.name, 'wait_timeout'))
+                    raise Overloaded(self.name)
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify()
+
+    def stats(self):
+        return {'active': self.active, 'waiting': self.waiting, 'limit': self.limit}
+
+
+gemini_limit = ConcurrencyLimit('gemini', GEMINI_CONCURRENCY, GEMINI_MAX_WAITING, GEMINI_WAIT_TIMEOUT)
+firebase_limit = ConcurrencyLimit('firebase', FIREBASE_CONCURRENCY, FIREBASE_MAX_WAITING, FIREBASE_WAIT_TIMEOUT)
+for _limit in (gemini_limit, firebase_limit):
+    metrics.registry.gauge(f'admission_{_limit.name}_active', f'{_limit.name} calls in flight',
+                           lambda limit=_limit: limit.active)
+    metrics.registry.gauge(f'admission_{_limit.name}_waiting', f'{_limit.name} calls waiting for a slot',
+                           lambda limit=_limit: limit.waiting)
+
+
+def client_ip():
+    if TRUST_FORWARDED and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr
+
+
+def init_app(app, rate_limits):
+    # Register after the session check so g.session identifies the user
+    @app.before_request
+    def admit():
+        if request.url_rule is None or request.method == 'OPTIONS':
+            return None
+        rule = request.url_rule.rule
+        if rule not in rate_limits.buckets:
+            return None
+        session = getattr(g, 'session', None)
+        body = request.get_json(silent=True)
+        user = session['uid'] if session else (
+            (body.get('username') or body.get('hostname')) if isinstance(body, dict) else None)
+        if rate_limits.check(rule, client_ip(), user):
+            response = jsonify({'error': 'Too many requests, slow down'})
+            response.headers['Retry-After'] = str(rate_limits.retry_after(rule))
+            return response, 429
+        return None
+
+    @app.errorhandler(Overloaded)
+    def overloaded(e):
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+
+def limit_event(rate_limits, event, user_of=None):
+    # Decorator for Socket.IO handlers; apply below @socketio.on(...).
+    # `user_of(*args)` names the user when the payload identifies one.
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            user = user_of(*args) if user_of else None
+            if rate_limits.check(event, client_ip(), user):
+                emit('error', {'message': 'Too many requests, slow down.'})
+                return None
+            try:
+                return handler(*args, **kwargs)
+            except Overloaded as e:
+                emit('error', {'message': str(e)})
+                return None
+        return wrapper
+    return decorator
+
+
+def stats():
+    return {
+        'gemini': gemini_limit.stats(),
+        'firebase': firebase_limit.stats(),
+        'shed': {f'{name}:{reason}': count for (name, reason), count in dict(shed_requests.values).items()},
+    }
@@ -0,0 +1,327 @@
+import json
+import logging
+import os
+import time
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from admission import Overloaded, gemini_limit
+from cache import SingleFlight
+from green_io import GREEN, fan_out
+from metrics import gemini_request_seconds
+from question_bank import QuestionBank, dedupe
+from sqlite_db import SQLiteDatabase
+
+
+# Gemini question generation. The model client is built once per process.
+# Requests are filled from the local question bank first and only the
+# shortfall is generated; every generated question is added to the bank.
+# Bank-bypassing ('fresh') requests are cached on disk by normalized
+# (count, topic) for AI_CACHE_TTL, so they avoid recycled bank questions
+# but not a repeat of an identical recent request. Concurrent identical
+# model calls share one generation.
+load_dotenv()
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash-latest')
+AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', 'ai_cache.sqlite3')
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', '500'))
+AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', str(7 * 24 * 3600)))
+# Large requests are split into chunks of at most AI_CHUNK_SIZE questions,
+# generated AI_PARALLELISM at a time, each retried up to AI_CHUNK_RETRIES times
+AI_CHUNK_SIZE = int(os.getenv('AI_CHUNK_SIZE', '10'))
+AI_PARALLELISM = int(os.getenv('AI_PARALLELISM', '4'))
+AI_CHUNK_RETRIES = int(os.getenv('AI_CHUNK_RETRIES', '2'))
+# Largest questionno a single request may ask for (an abuse guard; chunking
+# keeps requests up to this size fast)
+MAX_AI_QUESTIONS = int(os.getenv('MAX_AI_QUESTIONS', '100'))
+# gRPC calls block the whole process under eventlet; the REST transport goes
+# through the patched sockets and yields while waiting
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or ('rest' if GREEN else None)
+
+genai.configure(api_key=os.getenv('GEMINI_API_KEY'), transport=GEMINI_TRANSPORT)
+model = genai.GenerativeModel(GEMINI_MODEL, generation_config={"response_mime_type": "application/json"})
+
+
+class InvalidModelResponse(ValueError):
+    pass
+
+
+def build_prompt(count, topic, batch=None, batches=None):
+    prompt = (
+        f"Generate {count} {topic} multiple-choice questions in the following format: "
+        f"[{{'title': 'question text', 'options': ['option 1', 'option 2', 'option 3'], 'answer': 'correct_option_number'}}]. "
+        "The correct_option_number should be the index (1-based) of the correct answer in the options list."
+    )
+    if batches and batches > 1:
+        # Steer parallel chunks apart so fewer questions are lost to de-duplication
+        prompt += (f" This is batch {batch} of {batches}; cover a different aspect of the topic "
+                   "than the other batches.")
+    return prompt
+
+
+def normalize_topic(topic):
+    return ' '.join(str(topic).lower().split())
+
+
+def validate_question(item):
+    # Returns the question in canonical form, or None if it's unusable
+    if not isinstance(item, dict):
+        return None
+    title = item.get('title')
+    options = item.get('options')
+    if not isinstance(title, str) or not title.strip():
+        return None
+    if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, str) for o in options):
+        return None
+    try:
+        answer = int(str(item.get('answer')).strip())
+    except ValueError:
+        return None
+    if not 1 <= answer <= len(options):
+        return None
+    return {'title': title.strip(), 'options': options, 'answer': str(answer)}
+
+
+class QuestionStreamParser:
+    # Incrementally splits a streamed JSON array into its elements. A small
+    # scanner tracks nesting and string state across chunks, so each element
+    # is decoded once, as soon as its closing bracket arrives; a malformed
+    # element is dropped without losing the ones around it.
+    def __init__(self):
+        self.buffer = ''
+        self.started = False
+        self.finished = False
+        self.element_start = None
+        self.scan = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text):
+        self.buffer += text
+        elements = []
+        buffer = self.buffer
+        i = self.scan
+        while i < len(buffer) and not self.finished:
+            char = buffer[i]
+            if not self.started:
+                if char == '[':
+                    self.started = True
+            elif self.element_start is None:
+                if char == ']':
+                    self.finished = True
+                elif char not in ' \t\r\n,':
+                    self.element_start = i
+                    self.depth = 0
+                    continue
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]' or (char == ',' and self.depth == 0):
+                if char != ',':
+                    self.depth -= 1
+                if self.depth <= 0:
+                    end = i + 1 if char != ',' and self.depth == 0 else i
+                    try:
+                        elements.append(json.loads(buffer[self.element_start:end]))
+                    except json.JSONDecodeError:
+                        pass
+                    self.element_start = None
+                    if self.depth < 0:
+                        self.finished = True
+            i += 1
+
+        # Drop what has been consumed so the buffer only holds the element in progress
+        keep = self.element_start if self.element_start is not None else i
+        self.buffer = buffer[keep:]
+        self.scan = i - keep
+        if self.element_start is not None:
+            self.element_start = 0
+        return elements
+
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generated (
+    count INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (count, topic)
+);
+CREATE INDEX IF NOT EXISTS generated_last_used ON generated (last_used);
+"""
+
+
+class GenerationCache:
+    # Persistent (count, topic) -> questions cache with a TTL and LRU eviction
+    def __init__(self, path=AI_CACHE_PATH, max_entries=AI_CACHE_SIZE, ttl=AI_CACHE_TTL):
+        self.db = SQLiteDatabase(path, CACHE_SCHEMA)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, count, topic):
+        now = time.time()
+        rows = self.db.execute('SELECT questions FROM generated WHERE count = ? AND topic = ? AND created > ?',
+                               (count, topic, now - self.ttl))
+        if not rows:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute('UPDATE generated SET last_used = ? WHERE count = ? AND topic = ?', (now, count, topic))
+        return json.loads(rows[0][0])
+
+    def put(self, count, topic, questions):
+        now = time.time()
+        with self.db.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO generated VALUES (?, ?, ?, ?, ?)',
+                               (count, topic, json.dumps(questions), now, now))
+            connection.execute('DELETE FROM generated WHERE created <= ?', (now - self.ttl,))
+            connection.execute(
+                'DELETE FROM generated WHERE rowid IN '
+                '(SELECT rowid FROM generated ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,))
+
+    def stats(self):
+        return {'entries': self.db.execute('SELECT COUNT(*) FROM generated')[0][0],
+                'hits': self.hits, 'misses': self.misses}
+
+
+generation_cache = GenerationCache()
+generation_flight = SingleFlight()
+question_bank = QuestionBank()
+
+logger = logging.getLogger(__name__)
+
+
+def parse_questions(chunks):
+    # Yields validated questions as soon as each array element is complete
+    parser = QuestionStreamParser()
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            question = validate_question(item)
+            if question is not None:
+                yield question
+
+
+def call_model(count, topic, batch=None, batches=None):
+    # Valid questions before a malformed or truncated tail are kept
+    with gemini_limit.slot(), gemini_request_seconds.time('blocking'):
+        response = model.generate_content(build_prompt(count, topic, batch, batches))
+    questions = list(parse_questions([response.text]))
+    if not questions:
+        raise InvalidModelResponse("The model response did not contain any valid questions")
+    return questions[:count]
+
+
+def _call_chunk(count, topic, batch, batches):
+    for attempt in range(AI_CHUNK_RETRIES + 1):
+        try:
+            return call_model(count, topic, batch, batches)
+        except Overloaded:
+            # Shed the whole request rather than queue retries behind the limit
+            raise
+        except Exception as e:
+            if attempt == AI_CHUNK_RETRIES:
+                logger.warning("Chunk %s/%s failed: %s", batch, batches, e)
+                return []
+            time.sleep(0.5 * (attempt + 1))
+
+
+def call_model_chunked(count, topic):
+    # Splits large requests into concurrent chunks, then merges and
+    # de-duplicates; one extra round tops up what duplicates removed
+    if count <= AI_CHUNK_SIZE:
+        return dedupe(call_model(count, topic))
+
+    questions = []
+    seen = set()
+    for _ in range(2):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+        sizes = [min(AI_CHUNK_SIZE, missing - start) for start in range(0, missing, AI_CHUNK_SIZE)]
+        chunks = fan_out(lambda args: _call_chunk(args[1], topic, args[0] + 1, len(sizes)),
+                         enumerate(sizes), limit=AI_PARALLELISM)
+        for chunk in chunks:
+            questions += dedupe(chunk, seen)
+
+    if not questions:
+        raise InvalidModelResponse("The model response did not contain any valid questions")
+    return questions[:count]
+
+
+def stream_questions(count, topic, use_bank=True):
+    # Streaming mode: questions are yielded while the model is still writing
+    topic = normalize_topic(topic)
+    if use_bank:
+        questions = question_bank.take(topic, count)
+    else:
+        questions = generation_cache.get(count, topic) or []
+    yield from questions
+    if len(questions) >= count:
+        return
+
+    seen = set()
+    dedupe(questions, seen)
+    generated = []
+    with gemini_limit.slot(), gemini_request_seconds.time('stream'):
+        response = model.generate_content(build_prompt(count - len(questions), topic), stream=True)
+        for question in parse_questions(chunk.text for chunk in response):
+            if not dedupe([question], seen):
+                continue
+            generated.append(question)
+            yield question
+            if len(questions) + len(generated) == count:
+                break
+
+    question_bank.add(generated, topic, 'gemini')
+    if not use_bank and len(generated) == count:
+        generation_cache.put(count, topic, generated)
+
+
+def generate_from_model(count, topic, cached=True):
+    # `topic` must already be normalized
+    if cached:
+        questions = generation_cache.get(count, topic)
+        if questions is not None:
+            return questions
+
+    def generate():
+        questions = call_model_chunked(count, topic)
+        question_bank.add(questions, topic, 'gemini')
+        # Partial results are returned but not cached
+        if cached and len(questions) == count:
+            generation_cache.put(count, topic, questions)
+        return questions
+
+    questions, _ = generation_flight.do((count, topic, cached), generate)
+    return questions
+
+
+def generate_questions(count, topic, use_bank=True):
+    topic = normalize_topic(topic)
+    if not use_bank:
+        return generate_from_model(count, topic)
+
+    questions = question_bank.take(topic, count)
+    if len(questions) >= count:
+        return questions
+
+    # Only the shortfall goes to the model; the generation cache is skipped
+    # here since its entries are already in the bank
+    seen = set()
+    dedupe(questions, seen)
+    generated = dedupe(generate_from_model(count - len(questions), topic, cached=False), seen)
+    return questions + generated[:count - len(questions)]
@@ -0,0 +1,139 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+
+AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', '4'))
+AI_JOB_QUEUE_SIZE = int(os.getenv('AI_JOB_QUEUE_SIZE', '32'))
+AI_JOB_TTL = float(os.getenv('AI_JOB_TTL', '600'))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Runs slow generation calls on a fixed number of Socket.IO background tasks
+# fed by a bounded queue, so web workers return immediately. Finished jobs
+# are kept for AI_JOB_TTL seconds for polling and are also pushed to the
+# requesting socket. A job function receives a `progress(item)` callback for
+# partial results, which are pushed as they are produced.
+class JobQueue:
+    def __init__(self, socketio, event='ai_job_done', progress_event='ai_job_progress',
+                 workers=AI_JOB_WORKERS, max_pending=AI_JOB_QUEUE_SIZE, ttl=AI_JOB_TTL):
+        self.socketio = socketio
+        self.event = event
+        self.progress_event = progress_event
+        self.workers = workers
+        self.ttl = ttl
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.started = False
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_times = deque(maxlen=500)
+        self.run_times = deque(maxlen=500)
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for _ in range(self.workers):
+            self.socketio.start_background_task(self._work)
+
+    def submit(self, fn, sid=None):
+        # Returns the job id, or None when the queue is full
+        self._start()
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {'status': 'queued', 'submitted': time.time(), 'sid': sid, 'fn': fn, 'partial': []}
+        with self.lock:
+            self.jobs[job_id] = job
+        try:
+            self.queue.put_nowait(job_id)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+                self.rejected += 1
+            return None
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = {key: value for key, value in job.items() if key not in ('fn', 'sid')}
+            snapshot['partial'] = list(job['partial'])
+            return snapshot
+
+    def _work(self):
+        while True:
+            job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                job['status'] = 'running'
+                job['started'] = time.time()
+                self.running += 1
+            try:
+                result = job.pop('fn')(lambda item: self._progress(job_id, job, item))
+                update = {'status': 'done', 'data': result}
+            except Exception as e:
+                update = {'status': 'failed', 'error': str(e)}
+            with self.lock:
+                job.update(update)
+                job['finished'] = time.time()
+                self.running -= 1
+                if update['status'] == 'done':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.wait_times.append(job['started'] - job['submitted'])
+                self.run_times.append(job['finished'] - job['started'])
+
+            if job['sid']:
+                payload = {'job_id': job_id}
+                payload.update(update)
+                self.socketio.emit(self.event, payload, to=job['sid'])
+
+    def _progress(self, job_id, job, item):
+        with self.lock:
+            job['partial'].append(item)
+            index = len(job['partial']) - 1
+        if job['sid']:
+            self.socketio.emit(self.progress_event, {'job_id': job_id, 'index': index, 'item': item},
+                               to=job['sid'])
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.get('finished', time.time()) < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            wait_times = list(self.wait_times)
+            run_times = list(self.run_times)
+            return {
+                'queue_depth': self.queue.qsize(),
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'wait_seconds_p50': percentile(wait_times, 0.5),
+                'wait_seconds_p95': percentile(wait_times, 0.95),
+                'run_seconds_p50': percentile(run_times, 0.5),
+                'run_seconds_p95': percentile(run_times, 0.95),
+            }
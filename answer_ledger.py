@@ -0,0 +1,91 @@
+import struct
+from array import array
+
+
+# Per-quiz answer ledger. Each player gets a fixed-width row in two shared
+# bytearrays (one bit per question for "answered" and for "correct") and a
+# running total, so duplicate submissions are rejected in O(1) and scores
+# never have to be re-summed.
+class QuizLedger:
+    def __init__(self, number_of_questions):
+        self.number_of_questions = number_of_questions
+        self.row_bytes = (number_of_questions + 7) // 8
+        self.user_index = {}
+        self.answered = bytearray()
+        self.correct = bytearray()
+        self.totals = array('I')
+
+    def __len__(self):
+        return len(self.user_index)
+
+    def __contains__(self, username):
+        return username in self.user_index
+
+    def add_user(self, username):
+        index = self.user_index.get(username)
+        if index is None:
+            index = len(self.totals)
+            self.user_index[username] = index
+            self.answered.extend(bytes(self.row_bytes))
+            self.correct.extend(bytes(self.row_bytes))
+            self.totals.append(0)
+        return index
+
+    def record(self, username, question_index, is_correct):
+        # Returns False for out-of-range or already answered questions
+        if not isinstance(question_index, int) or not 0 <= question_index < self.number_of_questions:
+            return False
+        index = self.add_user(username)
+        byte = index * self.row_bytes + (question_index >> 3)
+        bit = 1 << (question_index & 7)
+        if self.answered[byte] & bit:
+            return False
+        self.answered[byte] |= bit
+        if is_correct:
+            self.correct[byte] |= bit
+            self.totals[index] += 1
+        return True
+
+    def total(self, username):
+        index = self.user_index.get(username)
+        return 0 if index is None else self.totals[index]
+
+    def scores(self):
+        totals = self.totals
+        return {username: totals[index] for username, index in self.user_index.items()}
+
+    def row(self, username):
+        # Per-question 0/1 list, the shape quiz_map used to store
+        index = self.user_index.get(username)
+        if index is None:
+            return None
+        offset = index * self.row_bytes
+        return [(self.correct[offset + (q >> 3)] >> (q & 7)) & 1
+                for q in range(self.number_of_questions)]
+
+    def dump(self):
+        # Compact binary form for snapshots: header, usernames in row order,
+        # then the two bitsets and the big-endian totals
+        names = sorted(self.user_index, key=self.user_index.get)
+        parts = [struct.pack('>II', self.number_of_questions, len(names))]
+        for name in names:
+            encoded = name.encode('utf-8')
+            parts.append(struct.pack('>H', len(encoded)) + encoded)
+        parts += [bytes(self.answered), bytes(self.correct),
+                  struct.pack(f'>{len(self.totals)}I', *self.totals)]
+        return b''.join(parts)
+
+    @classmethod
+    def load(cls, data):
+        number_of_questions, users = struct.unpack_from('>II', data)
+        ledger = cls(number_of_questions)
+        offset = 8
+        for index in range(users):
+            (length,) = struct.unpack_from('>H', data, offset)
+            ledger.user_index[bytes(data[offset + 2:offset + 2 + length]).decode('utf-8')] = index
+            offset += 2 + length
+        size = users * ledger.row_bytes
+        ledger.answered = bytearray(data[offset:offset + size])
+        ledger.correct = bytearray(data[offset + size:offset + 2 * size])
+        ledger.totals = array('I', struct.unpack_from(f'>{users}I', data, offset + 2 * size))
+        return ledger
@@ -1,17 +1,38 @@
-from flask import Flask, jsonify, request
+# Must stay the first import: patches the standard library under eventlet
+import green_io
+import hmac
+import secrets
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-import os
-import pyrebase
-import google.generativeai as genai
-from flask_socketio import SocketIO, emit
-from collections import defaultdict
-import json
-import re
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from quiz_store import create_quiz_store
+from rooms import quiz_room, host_room
+from firebase_fanout import write_quiz_fanout, host_quiz_path
+from quiz_index import index_path, index_entry, legacy_host
+import quiz_history
+import ai_generator
+from ai_jobs import JobQueue
+import wire
+from wire import WireSessions, emit_room
+from firebase_client import auth, database, call_stats
+from cache import PathCache
+from result_log import ResultLog
+from quiz_timer import QuizScheduler, quiz_deadline
+from quiz_snapshot import start_snapshots
+import session_tokens
+from session_tokens import SessionTokens, bearer_token
+import admission
+from admission import Overloaded, RateLimits
+import metrics
+import logging
+from log_config import setup_logging
 
 
 # Load environment variables
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {
@@ -19,26 +40,103 @@ CORS(app, resources={r"/*": {
     "methods": ["GET", "POST", "OPTIONS"],
     "allow_headers": ["Content-Type", "Authorization"]
 }})
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=green_io.ASYNC_MODE, **wire.socketio_options())
 
-# Firebase configuration
-firebaseConfig = {
-    'apiKey': os.getenv('API_KEY'),
-    'authDomain': os.getenv('AUTH_DOMAIN'),
-    'projectId': os.getenv('PROJECT_ID'),
-    'storageBucket': os.getenv('STORAGE_BUCKET'),
-    'messagingSenderId': os.getenv('MESSAGING_SENDER_ID'),
-    'appId': os.getenv('APP_ID'),
-    'measurementId': os.getenv('MEASUREMENT_ID'),
-    'databaseURL': os.getenv('DATABASE_URL')
-}
+# Live quiz state, in-process or shared between workers (QUIZ_STORE); the
+# in-process store is snapshotted and restored lazily after a restart
+quiz_store = create_quiz_store()
+start_snapshots(socketio, quiz_store)
 
-# Initialize Firebase
-firebase = pyrebase.initialize_app(firebaseConfig)
-auth = firebase.auth()
+# Read-through cache for dashboard reads, invalidated by our own writes
+read_cache = PathCache()
 
-# Initialize quiz map
-quiz_map = {}
+# Background AI generation jobs, results pushed to the host's socket
+ai_jobs = JobQueue(socketio)
+
+# Per-socket wire encoding and compact quiz/user handles
+wire_sessions = WireSessions()
+
+# Signed session tokens from /login, verified locally on every request
+sessions = SessionTokens()
+# /logout is public so an expired session can still revoke its refresh token
+PUBLIC_ENDPOINTS = {'home', 'signup_form', 'login', 'refresh_session', 'logout', 'metrics', 'static'}
+
+# Per-IP/per-user token buckets for expensive routes and events (RATE_LIMITS)
+rate_limits = RateLimits()
+
+# Final results are logged locally and flushed to Firebase in the background;
+# unflushed results from a previous run are replayed now
+result_log = ResultLog(socketio, database, on_flushed=read_cache.invalidate)
+result_log.start()
+
+
+def expire_quiz(key, reason):
+    hostname, quiz_id = key
+    info = quiz_store.get_info(hostname, quiz_id)
+    if info is None:
+        # Already ended, possibly by another worker
+        return
+    if not info.get('deadline'):
+        # Not started through /add_data (e.g. left over from an older
+        # version): drop it without writing results over the real ones
+        quiz_store.delete_quiz(hostname, quiz_id)
+        wire_sessions.release_quiz(hostname, quiz_id)
+        return
+    if reason == 'abandoned':
+        # With a shared store the quiz may be busy on another worker
+        last_active = quiz_store.last_active(hostname, quiz_id)
+        if last_active is not None and not quiz_timers.is_idle(last_active):
+            quiz_timers.schedule(key, info['deadline'], last_active)
+            return
+    try:
+        finish_quiz(hostname, quiz_id, reason)
+    except OSError as e:
+        logger.error("Could not log results of %s, retrying in a minute: %s", quiz_id, e)
+        quiz_timers.schedule(key, quiz_deadline(1))
+
+
+def send_time_remaining(key, seconds):
+    emit_room(socketio, 'time_remaining', {'quiz_id': key[1], 'time_remaining': round(seconds)}, quiz_room(key[1]))
+
+
+def rearm_timers():
+    for host, quiz_id in quiz_store.live_quizzes():
+        quiz_timers.schedule((host, quiz_id), (quiz_store.get_info(host, quiz_id) or {}).get('deadline'))
+
+
+# Ends quizzes when their time is up or they go idle, and counts down to the
+# room; quizzes kept across a restart are re-armed in the background so
+# restored state is loaded without delaying startup
+quiz_timers = QuizScheduler(socketio, expire_quiz, send_time_remaining)
+socketio.start_background_task(rearm_timers)
+
+# Prometheus metrics at /metrics: route, socket event, Firebase and Gemini
+# latency histograms plus live gauges evaluated on scrape
+metrics.init_app(app)
+call_stats.add_listener(
+    lambda method, seconds, ok: metrics.firebase_request_seconds.observe((method, str(ok).lower()), seconds))
+metrics.registry.gauge('quiz_active_quizzes', 'Quizzes live in the quiz store',
+                       lambda: len(quiz_store.live_quizzes()))
+# /metrics is public, so no series is labelled by host or quiz id (ids embed
+# the host's username)
+metrics.registry.gauge('quiz_participants', 'Participants across live quizzes',
+                       lambda: sum(len(quiz_store.scores(host, quiz_id) or {})
+                                   for host, quiz_id in quiz_store.live_quizzes()))
+metrics.registry.gauge('ai_job_queue_depth', 'Generation jobs waiting for a worker',
+                       lambda: ai_jobs.queue.qsize())
+
+
+@app.before_request
+def authenticate():
+    # g.session holds the caller's token claims, or None. With AUTH_REQUIRED
+    # every non-public route needs a valid 'Authorization: Bearer' token.
+    g.session = sessions.verify(bearer_token(request.headers.get('Authorization')))
+    if (g.session is None and session_tokens.AUTH_REQUIRED and request.method != 'OPTIONS'
+            and request.endpoint not in PUBLIC_ENDPOINTS):
+        return jsonify({'error': 'Valid session token required'}), 401
+
+
+admission.init_app(app, rate_limits)
 
 
 # Routes
@@ -48,34 +146,26 @@ def home():
     return jsonify({"message": "This is backend created for fixit"})
 
 
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'firebase': call_stats.snapshot(),
+        'read_cache': read_cache.stats(),
+        'ai_cache': ai_generator.generation_cache.stats(),
+        'ai_jobs': ai_jobs.stats(),
+        'question_bank': ai_generator.question_bank.stats(),
+        'result_log': result_log.stats(),
+        'timers': quiz_timers.stats(),
+        'sessions': sessions.stats(),
+        'admission': admission.stats()
+    })
+
+
 @app.route('/signup', methods=['POST'])
 def signup_form():
     data = request.json
     email = data.get('email')
     password = data.get('password')
-    print(email) 
-    print(password)
-    # Firebase configuration
-    firebaseConfig = {
-        'apiKey': os.getenv('API_KEY'),
-        'authDomain': os.getenv('AUTH_DOMAIN'),
-        'projectId': os.getenv('PROJECT_ID'),
-        'storageBucket': os.getenv('STORAGE_BUCKET'),
-        'messagingSenderId': os.getenv('MESSAGING_SENDER_ID'),
-        'appId': os.getenv('APP_ID'),
-        'measurementId': os.getenv('MEASUREMENT_ID'),
-        'databaseURL': os.getenv('DATABASE_URL')
-    }
-
-
-    print(firebaseConfig)
-
-    # Initialize Firebase
-    firebase = pyrebase.initialize_app(firebaseConfig)
-    auth = firebase.auth()
-    
-    
-
 
     if not email or not password:
         return jsonify({"error": "No Data provided !!"}), 400
@@ -83,7 +173,11 @@ def signup_form():
     try:
         user = auth.create_user_with_email_and_password(email=email, password=password)
         return jsonify({"message": "User created successfully!", "uid": user['localId']}), 201
-    except:
+    except Overloaded:
+        # Shed by the Firebase concurrency limit: 503 from admission, not a bad password
+        raise
+    except Exception as e:
+        logger.warning("Signup failed: %s", e)
         return jsonify({"message": "Weak Password."}), 400
 
 @app.route('/login', methods=['POST'])
@@ -100,11 +194,36 @@ def login():
 
     try:
         user = auth.sign_in_with_email_and_password(email, password)
-        return jsonify({"message": "Login successfully!", "uid": user['localId']}), 200
+    except Overloaded:
+        raise
     except Exception as e:
-        print("Firebase Error:", e)  # Log the error for debugging
+        logger.warning("Firebase login error: %s", e)
         return jsonify({"error": "Unable to login", "details": str(e)}), 400
 
+    # Later calls present session_token; refresh_token renews it without Firebase
+    tokens = sessions.issue(user['localId'], email)
+    return jsonify({"message": "Login successfully!", "uid": user['localId'], **tokens}), 200
+
+
+@app.route('/session/refresh', methods=['POST'])
+def refresh_session():
+    data = request.get_json(silent=True) or {}
+    tokens = sessions.refresh(data.get('refresh_token'))
+    if tokens is None:
+        return jsonify({"error": "Invalid or expired refresh token"}), 401
+
+    return jsonify({"message": "Session refreshed", **tokens}), 200
+
+
+@app.route('/logout', methods=['POST'])
+def logout():
+    data = request.get_json(silent=True) or {}
+    token = data.get('refresh_token') or bearer_token(request.headers.get('Authorization'))
+    if not token or not sessions.revoke_token(token):
+        return jsonify({"error": "No valid session to log out"}), 400
+
+    return jsonify({"message": "Logged out"}), 200
+
 
 @app.route('/add_data', methods=['POST'])
 def start_quiz():
@@ -133,12 +252,19 @@ def start_quiz():
     if not isinstance(title, str) or not title.strip():
         return jsonify({'error': 'Invalid title format. Title should be a non-empty string'}), 400
 
-    # Initialize Firebase DB
-    db = firebase.database()
-    
-    # Start quiz logic
-    number_of_quizzes_conducted = len(quiz_map.get(username, []))
-    quiz_id = f"{username}quiz{number_of_quizzes_conducted}"
+    # Validate the answer before anything is written to Firebase
+    correct_answer = mcq[0].get('answer')
+    if not correct_answer:
+        return jsonify({'error': 'MCQ does not contain a valid answer field'}), 400
+
+    # Drop duplicate participants, keeping roster order
+    users = list(dict.fromkeys(users))
+
+    # Start quiz logic. The id embeds the Firebase push key the quiz entries
+    # are written under, so it stays unique across restarts and workers (the
+    # live quiz count is reused once a quiz ends)
+    key = database().generate_key()
+    quiz_id = f"{username}quiz{key}"
 
     # Prepare quiz data
     user_data = {
@@ -151,40 +277,46 @@ def start_quiz():
         'title': title
     }
 
-    # Push the quiz data to the database for the host (quiz creator)
-    try:
-        db.child('Users').child(username).child('Quizes Attended').child(quiz_id).push(user_data)
-    except Exception as e:
-        return jsonify({'error': f'Error adding quiz for host: {str(e)}'}), 500
-
-    # Push the quiz data to the database for each participant
+    # Write the host entry and all participant entries as one multi-path
+    # update (chunked and concurrent for large rosters)
+    key, failures = write_quiz_fanout(
+        database, username, quiz_id, user_data, users, key=key,
+        host_extra=lambda key: {
+            index_path(quiz_id): index_entry(username, host_quiz_path(username, quiz_id, key))
+        })
+    if 'host' in failures:
+        return jsonify({'error': f"Error adding quiz for host: {failures['host']}"}), 500
+
+    read_cache.invalidate(index_path(quiz_id))
+    read_cache.invalidate(f"Users/{username}/Quizes Attended/{quiz_id}")
     for user in users:
-        try:
-            db.child('Users').child(user).child('Your Quizes').child(quiz_id).push(user_data)
-        except Exception as e:
-            return jsonify({'error': f'Error adding quiz for user {user}: {str(e)}'}), 500
-
-    # Handle correct answer and quiz map logic
-    correct_answer = mcq[0].get('answer')
-    if not correct_answer:
-        return jsonify({'error': 'MCQ does not contain a valid answer field'}), 400
+        read_cache.invalidate(f"Users/{user}/Your Quizes/{quiz_id}")
 
-    # Initialize quiz map for the host and participants
-    quiz_map[username] = quiz_map.get(username, {})
-    quiz_map[username][quiz_id] = {
-        'users': {}, 
+    # Register the quiz and every participant in the quiz store, and arm its
+    # time limit. host_key is returned to the host only; host_joined asks for it
+    deadline = quiz_deadline(time)
+    host_key = secrets.token_urlsafe(16)
+    quiz_store.create_quiz(username, quiz_id, users, len(mcq), {
         'correct_answer': correct_answer, 
+        'answers': [str(question.get('answer')) for question in mcq],
         'time': time, 
-        'time_remaining': time
-    }
+        'time_remaining': time,
+        'deadline': deadline,
+        'host_key': host_key
+    })
+    quiz_timers.schedule((username, quiz_id), deadline)
 
-    # Initialize scores for all users in this quiz
-    number_of_questions = len(mcq)
-    for user in users:
-        quiz_map[username][quiz_id]['users'][user] = [0] * number_of_questions
+    # Host-authored questions feed the local question bank, topic = quiz title.
+    # The quiz is live by now, so a bank error must not fail the request.
+    authored = [q for q in map(ai_generator.validate_question, mcq) if q is not None]
+    try:
+        ai_generator.question_bank.add(authored, ai_generator.normalize_topic(title), 'host')
+    except Exception as e:
+        logger.warning("Could not add %s's questions to the question bank: %s", quiz_id, e)
 
-    # Return success message with quiz data
-    return jsonify({'message': 'Quiz Started Successfully!', 'quiz': mcq}), 200
+    # Return success message with quiz data, plus any participants whose entry couldn't be written
+    return jsonify({'message': 'Quiz Started Successfully!', 'quiz_id': quiz_id, 'host_key': host_key,
+                    'quiz': mcq, 'failed_users': failures}), 200
 
 
 @app.route('/end_game', methods=['POST'])
@@ -192,38 +324,62 @@ def end_game():
     data = request.json
     quiz_id = data.get('quiz_id')
     hostname = data.get('hostname')
-    print(quiz_id) 
-    print(hostname)
+    logger.debug("Ending quiz %s hosted by %s", quiz_id, hostname)
     if not quiz_id or not hostname:
         return jsonify({'error': 'Missing hostname or quiz_id'}), 400
 
+    try:
+        result = finish_quiz(hostname, quiz_id, 'ended_by_host')
+    except OSError as e:
+        logger.error("Could not log results of %s: %s", quiz_id, e)
+        return jsonify({'error': 'Could not save results, try again'}), 500
+    if result is None:
+        return jsonify({'error': 'Quiz not found'}), 404
+    winners, final_scores = result
+
+    return jsonify({
+        'message': 'Game ended successfully!',
+        'winners': winners,
+        'final_scores': final_scores
+    }), 200
 
-    quiz_data = quiz_map[hostname][quiz_id]
-    user_scores = quiz_data['users']
 
-    # Calculate scores
-    final_scores = {user: sum(scores) for user, scores in user_scores.items()}
-    print(final_scores)
+def finish_quiz(hostname, quiz_id, reason):
+    # Shared by /end_game and the quiz timers. Returns (winners, final_scores),
+    # or None if the quiz isn't live or is already being ended elsewhere;
+    # raises OSError if the result can't be logged.
+    # The claim makes this once-only per quiz across timers, /end_game and workers
+    if not quiz_store.claim_finish(hostname, quiz_id):
+        return None
+    # Running totals are kept by the store, no need to re-sum
+    final_scores = quiz_store.scores(hostname, quiz_id)
+    if final_scores is None:
+        return None
+    logger.debug("Final scores for %s (%s): %s", quiz_id, reason, final_scores)
     # Determine winners
-    max_score = max(final_scores.values())
+    max_score = max(final_scores.values(), default=0)
     winners = [user for user, score in final_scores.items() if score == max_score]
 
-    # Update Firebase
-    db = firebase.database()
-    db.child('Users').child(hostname).child('Quizes Attended').child(quiz_id).update({
-        'status': 'finished',
-        'winner': ', '.join(winners),  
-        'final_scores': final_scores  
-    })
+    # Durable in the local result log before the live copy is dropped;
+    # written to Firebase by the background flusher
+    try:
+        result_log.append(f"Users/{hostname}/Quizes Attended/{quiz_id}", {
+            'status': 'finished',
+            'winner': ', '.join(winners),
+            'final_scores': final_scores
+        })
+    except OSError:
+        quiz_store.release_finish(hostname, quiz_id)
+        raise
 
-    # Remove quiz from quiz_map
-    del quiz_map[hostname][quiz_id]
+    # Remove quiz from the live quiz store
+    quiz_store.delete_quiz(hostname, quiz_id)
+    wire_sessions.release_quiz(hostname, quiz_id)
+    quiz_timers.cancel((hostname, quiz_id))
 
-    return jsonify({
-        'message': 'Game ended successfully!',
-        'winners': winners,
-        'final_scores': final_scores
-    }), 200
+    emit_room(socketio, 'quiz_ended', {'quiz_id': quiz_id, 'reason': reason, 'winners': winners,
+                                       'final_scores': final_scores}, quiz_room(quiz_id))
+    return winners, final_scores
 
 
 @app.route('/read_data', methods=['POST'])
@@ -234,11 +390,27 @@ def read_data():
     if not username:
         return jsonify({'error': 'Missing Username'}), 400
 
-    db = firebase.database()
-    users = db.child('Users').child(username).child('Your Quizes').get()  
-
-    result_data = users.val()
-    print(result_data)
+    # Paginated mode: key-ordered pages, optionally summary-only, streamed
+    if any(field in data for field in ('limit', 'cursor', 'summary')):
+        limit = data.get('limit', quiz_history.READ_PAGE_BATCH)
+        cursor = data.get('cursor')
+        if not isinstance(limit, int) or not 0 < limit <= quiz_history.MAX_READ_PAGE:
+            return jsonify({'error': f'limit should be between 1 and {quiz_history.MAX_READ_PAGE}'}), 400
+
+        summary = bool(data.get('summary'))
+        first_batch = quiz_history.fetch_batch(database, read_cache, username, cursor,
+                                               min(quiz_history.READ_PAGE_BATCH, limit), summary)
+        if not first_batch and cursor is None:
+            return jsonify({'error': 'User data not found'}), 404
+
+        return Response(stream_with_context(quiz_history.stream_page(
+            database, read_cache, username, cursor, limit, summary, first_batch)),
+            mimetype='application/json')
+
+    result_data = read_cache.get_or_load(
+        f"Users/{username}/Your Quizes",
+        lambda: database().child('Users').child(username).child('Your Quizes').get().val())
+    logger.debug("Quiz history for %s: %s", username, result_data)
     if result_data:
         return jsonify({'message': 'Data fetched successfully!', 'data': result_data})
     else:
@@ -254,87 +426,206 @@ def get_quiz_data():
     if not username or not quizId:
         return jsonify({'error': 'Missing Data'}), 400
 
-    pattern = r"quiz\w*"
-    hostId = re.sub(pattern, "", quizId)
-    print(pattern)
-    db = firebase.database()
-    quiz_data = db.child('Users').child(hostId).child('Your Quizes').get(quizId)  
+    # Look the quiz up in the index and read just that node
+    entry = read_cache.get_or_load(
+        index_path(quizId),
+        lambda: database().child(index_path(quizId)).get().val())
 
-    result_data = quiz_data.val()
-    print(result_data)
+    if entry:
+        hostId = entry['host']
+        quiz = read_cache.get_or_load(entry['path'], lambda: database().child(entry['path']).get().val())
+        result_data = {entry['path'].rsplit('/', 1)[1]: quiz} if quiz else None
+    else:
+        # Quizzes created before the index existed
+        hostId = legacy_host(quizId)
+        quizzes = read_cache.get_or_load(
+            f"Users/{hostId}/Your Quizes",
+            lambda: database().child('Users').child(hostId).child('Your Quizes').get(quizId).val())
+        result_data = quizzes.get(quizId) if quizzes else None
+
+    logger.debug("Quiz %s: %s", quizId, result_data)
     if result_data:
-        return jsonify({'message': 'Data fetched successfully!', 'data': result_data[quizId],'hostname':hostId})
+        return jsonify({'message': 'Data fetched successfully!', 'data': result_data,'hostname':hostId})
     else:
         return jsonify({'error': 'User data not found'}), 404
 
 
 
-@app.route('/generate_data_ai', methods=['POST'])
-def generate_by_ai_data():
-    data = request.json
+def parse_generation_request(data):
+    # Returns (questionno, type, error response)
     questionno = data.get('questionno')
     quiz = data.get('type')
-    
+
     if not questionno or not quiz:
-        return jsonify({'error': 'Missing questionno or quiz type'}), 400
+        return None, None, (jsonify({'error': 'Missing questionno or quiz type'}), 400)
 
-    # Configure Gemini API
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-    model = genai.GenerativeModel('gemini-1.5-flash-latest', generation_config={"response_mime_type": "application/json"})
-    
-    # Generate questions using Gemini AI
-    prompt = (
-        f"Generate {questionno} {quiz} multiple-choice questions in the following format: "
-        f"[{{'title': 'question text', 'options': ['option 1', 'option 2', 'option 3'], 'answer': 'correct_option_number'}}]. "
-        "The correct_option_number should be the index (1-based) of the correct answer in the options list."
-    )
-    
-    response = model.generate_content(prompt)
+    try:
+        questionno = int(questionno)
+    except (TypeError, ValueError):
+        return None, None, (jsonify({'error': 'questionno should be a number'}), 400)
+    if not 1 <= questionno <= ai_generator.MAX_AI_QUESTIONS:
+        return None, None, (jsonify({
+            'error': f'questionno should be between 1 and {ai_generator.MAX_AI_QUESTIONS}'}), 400)
+    return questionno, quiz, None
 
-    result_data = response.text
+
+@app.route('/generate_data_ai', methods=['POST'])
+def generate_by_ai_data():
+    questionno, quiz, error = parse_generation_request(request.json)
+    if error:
+        return error
+
+    # Filled from the question bank first. 'fresh' skips the bank, so none of
+    # the questions are recycled from earlier quizzes; an identical fresh
+    # request within AI_CACHE_TTL is still answered from the generation cache
+    use_bank = not request.json.get('fresh')
     try:
-        questions = json.loads(result_data)
-    except json.JSONDecodeError:
-        print("Error: The response is not valid JSON.")
+        questions = ai_generator.generate_questions(questionno, quiz, use_bank)
+    except ai_generator.InvalidModelResponse as e:
+        logger.warning("Question generation failed: %s", e)
+        return jsonify({'error': str(e)}), 502
 
     return jsonify({'message': 'Questions generated successfully!', 'data': questions})
 
+
+@app.route('/generate_data_ai/jobs', methods=['POST'])
+def submit_generation_job():
+    data = request.json
+    questionno, quiz, error = parse_generation_request(data)
+    if error:
+        return error
+
+    # 'sid' is the host's Socket.IO id, used to push ai_job_progress / ai_job_done.
+    # 'fresh' has the same meaning as in /generate_data_ai
+    use_bank = not data.get('fresh')
+    if data.get('stream'):
+        # Each question is pushed to the host as soon as the model finishes it
+        def job(progress):
+            questions = []
+            for question in ai_generator.stream_questions(questionno, quiz, use_bank):
+                questions.append(question)
+                progress(question)
+            if not questions:
+                raise ai_generator.InvalidModelResponse("The model response did not contain any valid questions")
+            return questions
+    else:
+        def job(progress):
+            return ai_generator.generate_questions(questionno, quiz, use_bank)
+
+    job_id = ai_jobs.submit(job, sid=data.get('sid'))
+    if job_id is None:
+        return jsonify({'error': 'Too many generation jobs queued, try again later'}), 503
+
+    return jsonify({'message': 'Generation job queued', 'job_id': job_id}), 202
+
+
+@app.route('/generate_data_ai/jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    job = ai_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job), 200
+
 # Socket logic
+# Quiz events are scoped to the quiz's room instead of every connected socket
+
+def payload_user(data):
+    # Rate-limit key for events that name the player in their payload
+    return data.get('username') if isinstance(data, dict) else None
+
+
+def bound_user(packet):
+    # Rate-limit key for compact events, from the socket's user_joined binding
+    session = wire_sessions.session(request.sid)
+    return session[2] if session else None
+
+
+@socketio.on('host_joined')
+@metrics.timed_event('host_joined')
+def handle_host_join(data):
+    quiz_id = data.get('quiz_id')
+    hostname = data.get('hostname')
+
+    if not quiz_id or not hostname:
+        emit('error', {'message': 'hostname and quiz_id are required to host.'})
+        return
+
+    # The host room sees every submission, so only the holder of the
+    # host_key /add_data returned may join it
+    expected = (quiz_store.get_info(hostname, quiz_id) or {}).get('host_key')
+    if not expected or not hmac.compare_digest(str(data.get('host_key', '')), expected):
+        emit('error', {'message': 'Only the quiz host can join as host.'})
+        return
+
+    join_room(quiz_room(quiz_id))
+    join_room(host_room(quiz_id))
+
+
 @socketio.on('user_joined') 
+@metrics.timed_event('user_joined')
+@admission.limit_event(rate_limits, 'user_joined', payload_user)
 def handle_user_join(data): 
     username = data.get('username') 
+    quiz_id = data.get('quiz_id')
+    hostname = data.get('hostname')
     
-    if not username:
-        emit('error', {'message': 'Username is required to join.'}, broadcast=True)
+    if not username or not quiz_id:
+        emit('error', {'message': 'Username and quiz_id are required to join.'})
         return
     
-    emit('user_joined', {'message': f"{username} has joined the game!"}, broadcast=True)
+    # 'encoding': 'msgpack' opts this socket into the compact protocol
+    encoding = wire_sessions.negotiate(request.sid, data.get('encoding'))
+    join_room(wire_sessions.room_for(request.sid, quiz_room(quiz_id)))
+    if hostname:
+        quiz_timers.touch((hostname, quiz_id))
+        quiz_store.touch(hostname, quiz_id)
+        quiz_handle, user_handle = wire_sessions.bind(request.sid, hostname, quiz_id, username)
+        emit('joined', wire.encode({'encoding': encoding, 'quiz': quiz_handle, 'user': user_handle}, encoding))
+    emit_room(socketio, 'user_joined', {'message': f"{username} has joined the game!"}, quiz_room(quiz_id))
 
 
 @socketio.on('user_leaved') 
+@metrics.timed_event('user_leaved')
 def handle_user_leave(data): 
     username = data.get('username') 
+    quiz_id = data.get('quiz_id')
     
-    if not username:
-        emit('error', {'message': 'Username is required to leave.'}, broadcast=True)
+    if not username or not quiz_id:
+        emit('error', {'message': 'Username and quiz_id are required to leave.'})
         return
     
-    emit('user_left', {'message': f"{username} has left the game!"}, broadcast=True)
+    emit_room(socketio, 'user_left', {'message': f"{username} has left the game!"}, quiz_room(quiz_id))
+    leave_room(wire_sessions.room_for(request.sid, quiz_room(quiz_id)))
+
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    # Clients pass the session token as io(url, {auth: {token}})
+    token = auth.get('token') if isinstance(auth, dict) else None
+    if session_tokens.AUTH_REQUIRED and sessions.verify(token) is None:
+        return False
+    metrics.connected_sockets.add(1)
+
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    metrics.connected_sockets.add(-1)
+    wire_sessions.drop(request.sid)
 
 @app.route('/leaderboard',methods=['POST']) 
 def give_leaderboard(): 
     data = request.json 
     hostname = data.get('hostname') 
     quiz_id = data.get('quiz_id')
-    print(hostname) 
-    print(quiz_id)
     
     if not hostname or not quiz_id:
-        emit('error', {'message': 'hostname is required.'}, broadcast=True)
-        return
+        return jsonify({'error': 'hostname and quiz_id are required.'}), 400
 
-    users_data = quiz_map[hostname][quiz_id]['users'] 
-    print(users_data)
+    users_data = quiz_store.scores(hostname, quiz_id)
+    if users_data is None:
+        return jsonify({'error': 'Quiz not found'}), 404
+    logger.debug("Leaderboard for %s: %s", quiz_id, users_data)
     return jsonify({'message':'data recieved succesfully !','data':users_data}),200
     
 
@@ -345,6 +636,8 @@ def give_leaderboard():
 
 
 @socketio.on('submit_answer')
+@metrics.timed_event('submit_answer')
+@admission.limit_event(rate_limits, 'submit_answer', payload_user)
 def submit_answer(data):
     current_question_index = data.get('current_index')
     username = data.get('username')
@@ -352,29 +645,60 @@ def submit_answer(data):
     hostname = data.get('hostname')
     correct = data.get('correct_answer')
     quiz_id = data.get('quiz_id')
-    number_of_questions = data.get('number_of_questions')
-    
-    print(answer)
-    print(correct)
     
+    logger.debug("Answer from %s to question %s: %s (expected %s)",
+                 username, current_question_index, answer, correct)
 
-    if hostname not in quiz_map:
-        quiz_map[hostname] = {}
-
-    if quiz_id not in quiz_map[hostname]:
-        quiz_map[hostname][quiz_id] = {'users': {}}
+    # Only quizzes started through /add_data take answers; a late answer to an
+    # ended quiz must not bring it back
+    if not quiz_store.has_quiz(hostname, quiz_id):
+        emit('error', {'message': 'Quiz not found or already ended.'})
+        return
 
-    if username not in quiz_map[hostname][quiz_id]['users']:
-        quiz_map[hostname][quiz_id]['users'][username] =  [0] * number_of_questions
+    if record_submission(hostname, quiz_id, username, current_question_index, str(answer) == str(correct)):
+        emit('user_submit', {'message': f"Submitted answer!"})
 
 
-    if str(answer) == str(correct):
-        print(quiz_map)
-        quiz_map[hostname][quiz_id]['users'][username][current_question_index] += 1
+@socketio.on('a')
+@metrics.timed_event('a')
+@admission.limit_event(rate_limits, 'a', bound_user)
+def submit_compact_answer(packet):
+    # Compact answer: msgpack [question_index, option_index] from a socket
+    # bound in user_joined; scored against the answers stored at /add_data
+    session = wire_sessions.session(request.sid)
+    if session is None:
+        emit('error', {'message': 'Join the quiz with a hostname before sending compact answers.'})
+        return 0
+    hostname, quiz_id, username = session
 
-    print('Submitted answer of user')
-    print(quiz_map)
-    emit('user_submit', {'message': f"Submitted answer!"}, broadcast=True)
+    try:
+        question_index, option_index = wire.decode(packet)
+    except (TypeError, ValueError):
+        emit('error', {'message': 'Malformed answer packet.'})
+        return 0
+
+    answers = (quiz_store.get_info(hostname, quiz_id) or {}).get('answers')
+    if not answers or not isinstance(question_index, int) or not 0 <= question_index < len(answers):
+        emit('error', {'message': 'Unknown quiz or question.'})
+        return 0
+
+    # The handler's return value is the (tiny) acknowledgement
+    return int(record_submission(hostname, quiz_id, username, question_index,
+                                 str(option_index) == answers[question_index]))
+
+
+def record_submission(hostname, quiz_id, username, question_index, is_correct):
+    # Each question counts once per user, resent answers are rejected
+    if not quiz_store.record_answer(hostname, quiz_id, username, question_index, is_correct):
+        emit('error', {'message': 'Answer already submitted.'})
+        return False
+
+    logger.debug("Recorded answer from %s to question %s of %s", username, question_index, quiz_id)
+    quiz_timers.touch((hostname, quiz_id))
+    # Notify only the host channel; the caller acknowledges to the player
+    emit('user_submit', {'message': f"{username} submitted an answer!", 'username': username},
+         to=host_room(quiz_id))
+    return True
 
 
 if __name__ == "__main__":
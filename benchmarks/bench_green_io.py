@@ -0,0 +1,79 @@
+# Serial vs concurrent outbound calls through green_io, against the
+# in-memory Firebase and Gemini fakes with simulated latency: a large-roster
+# quiz fan-out write and a chunked Gemini generation. Runs in whichever mode
+# green_io resolves: ASYNC_MODE if it is set, otherwise eventlet when it is
+# installed and threading when it is not.
+#
+#   python benchmarks/bench_green_io.py --roster 1000 --firebase-latency 0.05
+#   ASYNC_MODE=threading python benchmarks/bench_green_io.py
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import green_io
+import fakes
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def report(label, serial, concurrent):
+    print(f"{label:>14}: serial {serial * 1000:8.1f} ms | concurrent {concurrent * 1000:8.1f} ms"
+          f" | {serial / concurrent:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--roster', type=int, default=1000, help='participants in the fan-out write')
+    parser.add_argument('--questions', type=int, default=40, help='questions in the chunked generation')
+    parser.add_argument('--firebase-latency', type=float, default=0.05)
+    parser.add_argument('--gemini-latency', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='bench_green_io-')
+    os.environ.setdefault('AI_CACHE_PATH', os.path.join(scratch, 'ai_cache.sqlite3'))
+    os.environ.setdefault('QUESTION_BANK_PATH', os.path.join(scratch, 'question_bank.sqlite3'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    fakes.install(args.firebase_latency, args.gemini_latency)
+
+    import ai_generator
+    import firebase_fanout
+    from firebase_client import database
+
+    print(f"mode {green_io.ASYNC_MODE}, Firebase latency {args.firebase_latency * 1000:.0f} ms, "
+          f"Gemini latency {args.gemini_latency * 1000:.0f} ms")
+
+    users = [f'player{i}' for i in range(args.roster)]
+    data = {'Quiz': fakes.fake_questions(10, 'bench'), 'status': 'ongoing'}
+
+    def fanout():
+        firebase_fanout.write_quiz_fanout(database, 'host', 'hostquiz0', data, users)
+
+    workers = firebase_fanout.FANOUT_WORKERS
+    firebase_fanout.FANOUT_WORKERS = 1
+    serial = timed(fanout, args.repeat)
+    firebase_fanout.FANOUT_WORKERS = workers
+    report(f'fan-out x{args.roster}', serial, timed(fanout, args.repeat))
+
+    def generate():
+        ai_generator.call_model_chunked(args.questions, 'bench')
+
+    parallelism = ai_generator.AI_PARALLELISM
+    ai_generator.AI_PARALLELISM = 1
+    serial = timed(generate, 1)
+    ai_generator.AI_PARALLELISM = parallelism
+    report(f'gemini x{args.questions}', serial, timed(generate, 1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Micro-benchmark: skip-list Leaderboard vs the heap-rebuild version it replaced.
+#
+#   python benchmarks/bench_leaderboard.py --players 2000 --answers 20000
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import Leaderboard
+
+
+class HeapLeaderboard:
+    # The original server.py implementation, kept here as the baseline
+    def __init__(self):
+        self.heap = []
+        self.candidate_map = {}
+
+    def add_candidate(self, username, score):
+        if username in self.candidate_map:
+            self.update_score(username, score)
+        else:
+            heapq.heappush(self.heap, (-score, username))
+            self.candidate_map[username] = score
+
+    def update_score(self, username, new_score):
+        self.candidate_map[username] = new_score
+        self.heap = [(-score, name) if name != username else (-new_score, name)
+                     for score, name in self.heap]
+        heapq.heapify(self.heap)
+
+    def get_top_candidates(self, n):
+        return [(username, -score) for score, username in heapq.nlargest(n, self.heap)]
+
+
+def run(board_cls, players, answers, seed):
+    rng = random.Random(seed)
+    board = board_cls()
+    names = [f"player{i}" for i in range(players)]
+    scores = dict.fromkeys(names, 0)
+
+    start = time.perf_counter()
+    for name in names:
+        board.add_candidate(name, 0)
+    join_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(answers):
+        name = names[rng.randrange(players)]
+        scores[name] += 1
+        board.update_score(name, scores[name])
+    update_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        board.get_top_candidates(5)
+    top_time = time.perf_counter() - start
+
+    return join_time, update_time, top_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--answers', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.players} players, {args.answers} correct answers")
+    for label, board_cls in (("heap (old)", HeapLeaderboard), ("skip list", Leaderboard)):
+        join_time, update_time, top_time = run(board_cls, args.players, args.answers, args.seed)
+        print(f"{label:>12}: join {join_time * 1e3:8.1f} ms | "
+              f"update {update_time / args.answers * 1e6:8.2f} us/op | "
+              f"top-5 {top_time * 1e3:6.3f} us/op")
+
+
+if __name__ == "__main__":
+    main()
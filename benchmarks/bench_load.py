@@ -0,0 +1,211 @@
+# End-to-end load test of app.py against in-memory Firebase and Gemini
+# fakes (benchmarks/fakes.py). Starts the Socket.IO server in-process, then
+# for each quiz: the host creates it with /add_data, N python-socketio
+# players run user_joined -> submit_answer (one per question, acknowledged)
+# -> /leaderboard, and the host calls /end_game. Reports throughput and
+# p50/p95/p99 latency per event and saves the results as JSON.
+#
+#   python benchmarks/bench_load.py --quizzes 4 --players 50 --questions 10
+#   python benchmarks/bench_load.py --output new.json --compare baseline.json
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import socketio
+from engineio.payload import Payload
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes
+from ai_jobs import percentile
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def time(self, event, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            with self.lock:
+                self.errors[event] = self.errors.get(event, 0) + 1
+            return None
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples.setdefault(event, []).append(elapsed)
+        return result
+
+    def summary(self, wall_seconds):
+        report = {}
+        for event in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples.get(event, [])
+            report[event] = {
+                'count': len(samples),
+                'errors': self.errors.get(event, 0),
+                'per_second': len(samples) / wall_seconds if wall_seconds else None,
+                'p50_ms': _ms(percentile(samples, 0.5)),
+                'p95_ms': _ms(percentile(samples, 0.95)),
+                'p99_ms': _ms(percentile(samples, 0.99)),
+                'max_ms': _ms(max(samples, default=None)),
+            }
+        return report
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def start_server(port):
+    import app
+
+    # PooledAuth posts to the real identity toolkit; swap in the fake
+    app.auth = fakes.FakeAuth()
+    thread = threading.Thread(target=app.socketio.run, args=(app.app,),
+                              kwargs={'host': '127.0.0.1', 'port': port, 'use_reloader': False,
+                                      'log_output': False, 'allow_unsafe_werkzeug': True},
+                              daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            requests.get(url, timeout=1)
+            return url
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    raise RuntimeError('Server did not start')
+
+
+def run_player(url, transports, recorder, host, quiz_id, player, username, questions, start_barrier):
+    client = socketio.Client(reconnection=False)
+    try:
+        recorder.time('connect', lambda: client.connect(url, transports=transports, wait_timeout=10))
+        start_barrier.wait(timeout=60)
+        recorder.time('user_joined', lambda: client.call(
+            'user_joined', {'username': username, 'quiz_id': quiz_id, 'hostname': host}, timeout=30))
+        for index in range(questions):
+            recorder.time('submit_answer', lambda: client.call('submit_answer', {
+                'current_index': index, 'username': username, 'answer_submitted': str(1 + (index + player) % 4),
+                'hostname': host, 'correct_answer': str(1 + index % 4),
+                'quiz_id': quiz_id, 'number_of_questions': questions}, timeout=30))
+        recorder.time('leaderboard', lambda: requests.post(
+            f'{url}/leaderboard', json={'hostname': host, 'quiz_id': quiz_id}, timeout=30).raise_for_status())
+    finally:
+        client.disconnect()
+
+
+def run_quiz(url, transports, recorder, quiz, players, questions, start_barrier):
+    host = f'host{quiz}@example.com'
+    users = [f'player{quiz}-{i}@example.com' for i in range(players)]
+    mcq = fakes.fake_questions(questions, 'benchmark')
+
+    def add_data():
+        response = requests.post(f'{url}/add_data', json={
+            'username': host, 'time': 10, 'mcq': mcq, 'users': users, 'title': 'Load test'}, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    created = recorder.time('add_data', add_data)
+    if created is None:
+        # Players of the other quizzes would wait for this one's forever
+        start_barrier.abort()
+        return
+    quiz_id = created['quiz_id']
+    threads = [threading.Thread(target=run_player,
+                                args=(url, transports, recorder, host, quiz_id, player, user, questions,
+                                      start_barrier))
+               for player, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.time('end_game', lambda: requests.post(
+        f'{url}/end_game', json={'hostname': host, 'quiz_id': quiz_id}, timeout=60).raise_for_status())
+
+
+def compare(report, baseline):
+    print('\nChange vs baseline (p95):')
+    for event, result in report['events'].items():
+        before = baseline.get('events', {}).get(event, {}).get('p95_ms')
+        after = result['p95_ms']
+        if before and after:
+            print(f"{event:>14}: {before:9.2f} ms -> {after:9.2f} ms ({(after - before) / before:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quizzes', type=int, default=2)
+    parser.add_argument('--players', type=int, default=25, help='players per quiz')
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--firebase-latency', type=float, default=0.02, help='seconds per fake Firebase call')
+    parser.add_argument('--gemini-latency', type=float, default=0.5, help='seconds per fake Gemini call')
+    parser.add_argument('--transport', choices=('websocket', 'polling'), default='polling',
+                        help='websocket needs the websocket-client package')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', default='bench_load.json')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run')
+    args = parser.parse_args()
+
+    # Keep the benchmark's caches and question bank out of the working tree
+    scratch = tempfile.mkdtemp(prefix='bench_load_')
+    for name, filename in (('AI_CACHE_PATH', 'ai_cache.sqlite3'), ('QUESTION_BANK_PATH', 'question_bank.sqlite3'),
+                           ('QUIZ_STORE_PATH', 'quiz_state.sqlite3'), ('RESULT_LOG_PATH', 'results.log'),
+                           ('QUIZ_SNAPSHOT_PATH', 'quiz_state.snap')):
+        os.environ.setdefault(name, os.path.join(scratch, filename))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOG_LEVELS', 'werkzeug=WARNING')
+    # Every simulated player shares 127.0.0.1, so per-IP limits would shed the run
+    os.environ.setdefault('RATE_LIMIT_IP_FACTOR', '1000')
+    # A poll can carry one join broadcast per player; the Python client
+    # aborts on more than 16 packets per payload by default
+    Payload.max_decode_packets = max(Payload.max_decode_packets, 4 * args.players)
+
+    store = fakes.install(args.firebase_latency, args.gemini_latency)
+    url = start_server(args.port)
+    recorder = Recorder()
+    start_barrier = threading.Barrier(args.quizzes * args.players)
+
+    start = time.perf_counter()
+    quizzes = [threading.Thread(target=run_quiz,
+                                args=(url, [args.transport], recorder, quiz, args.players, args.questions,
+                                      start_barrier))
+               for quiz in range(args.quizzes)]
+    for thread in quizzes:
+        thread.start()
+    for thread in quizzes:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+
+    report = {
+        'config': vars(args),
+        'wall_seconds': round(wall_seconds, 3),
+        'firebase_calls': store.calls,
+        'events': recorder.summary(wall_seconds),
+    }
+    print(f"{args.quizzes} quizzes x {args.players} players x {args.questions} questions "
+          f"in {wall_seconds:.2f} s ({store.calls} Firebase calls)")
+    for event, result in report['events'].items():
+        print(f"{event:>14}: {result['count']:6d} ok {result['errors']:4d} err | "
+              f"{result['per_second'] or 0:8.1f}/s | p50 {result['p50_ms'] or 0:8.2f} ms | "
+              f"p95 {result['p95_ms'] or 0:8.2f} ms | p99 {result['p99_ms'] or 0:8.2f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
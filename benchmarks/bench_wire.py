@@ -0,0 +1,70 @@
+# Bytes and CPU per submit_answer event: verbose JSON dict vs the compact
+# msgpack [question_index, option_index] packet, encoded the way
+# python-socketio puts them on the wire (per-client binary payload, and with
+# SOCKETIO_SERIALIZER=msgpack for the whole server).
+#
+#   python benchmarks/bench_wire.py --events 100000
+import argparse
+import os
+import sys
+import time
+
+import msgpack
+from socketio import msgpack_packet, packet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire
+
+
+JSON_ANSWER = {
+    'current_index': 7,
+    'username': 'player1234@example.com',
+    'answer_submitted': '2',
+    'hostname': 'host@example.com',
+    'correct_answer': '2',
+    'quiz_id': 'host@example.comquiz3',
+    'number_of_questions': 20,
+}
+COMPACT_ANSWER = [7, 2]
+
+
+def wire_size(encoded):
+    # Binary events encode to [header, attachment, ...]
+    if isinstance(encoded, list):
+        return sum(len(part) for part in encoded)
+    return len(encoded)
+
+
+def measure(label, event, make_payload, events, packet_class=packet.Packet):
+    start = time.perf_counter()
+    for _ in range(events):
+        encoded = packet_class(packet.EVENT, data=[event, make_payload()], namespace='/').encode()
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(events):
+        if isinstance(encoded, list):
+            decoded = packet.Packet(encoded_packet=encoded[0])
+            decoded.add_attachment(encoded[1])
+            wire.decode(decoded.data[1])
+        else:
+            packet_class(encoded_packet=encoded)
+    decode_time = time.perf_counter() - start
+
+    print(f"{label:>16}: {wire_size(encoded):4d} bytes | encode {encode_time / events * 1e6:6.2f} us | "
+          f"decode {decode_time / events * 1e6:6.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=50000)
+    args = parser.parse_args()
+
+    measure('json dict', 'submit_answer', lambda: JSON_ANSWER, args.events)
+    measure('msgpack compact', 'a', lambda: msgpack.packb(COMPACT_ANSWER), args.events)
+    measure('msgpack server', 'a', lambda: COMPACT_ANSWER, args.events, msgpack_packet.MsgPackPacket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# In-process stand-ins for pyrebase and google.generativeai, so the app can
+# be benchmarked without network access or credentials. install() must run
+# before app (or firebase_client / ai_generator) is imported.
+#
+# Both fakes sleep for a configurable latency per call to model the remote
+# round trip; the in-memory tree supports the subset of the pyrebase
+# Database API the app uses.
+import json
+import re
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import OrderedDict
+
+
+def _split(path):
+    return [part for part in str(path).split('/') if part]
+
+
+class FakeStore:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.root = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def read(self, parts):
+        self._call()
+        with self.lock:
+            node = self.root
+            for part in parts:
+                if not isinstance(node, dict) or part not in node:
+                    return None
+                node = node[part]
+            return json.loads(json.dumps(node))
+
+    def write(self, parts, value, merge, call=True):
+        if call:
+            self._call()
+        value = json.loads(json.dumps(value))
+        with self.lock:
+            node = self.root
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"Cannot write below a leaf at {'/'.join(parts)}")
+            if merge and isinstance(node.get(parts[-1]), dict) and isinstance(value, dict):
+                node[parts[-1]].update(value)
+            else:
+                node[parts[-1]] = value
+
+
+class FakeItem:
+    def __init__(self, key, value):
+        self._key = key
+        self._value = value
+
+    def key(self):
+        return self._key
+
+    def val(self):
+        return self._value
+
+
+class FakeResponse:
+    def __init__(self, value):
+        self.value = value
+
+    def val(self):
+        return self.value
+
+    def each(self):
+        if not isinstance(self.value, dict) or not self.value:
+            return None
+        return [FakeItem(key, value) for key, value in self.value.items()]
+
+
+class FakeDatabase:
+    def __init__(self, store):
+        self.store = store
+        self.parts = []
+        self.query = {}
+
+    def child(self, *args):
+        for arg in args:
+            self.parts += _split(arg)
+        return self
+
+    def order_by_key(self):
+        self.query['order_by_key'] = True
+        return self
+
+    def start_at(self, value):
+        self.query['start_at'] = value
+        return self
+
+    def limit_to_first(self, count):
+        self.query['limit_to_first'] = count
+        return self
+
+    def generate_key(self):
+        return '-' + uuid.uuid4().hex[:19]
+
+    def get(self, token=None):
+        value = self.store.read(self.parts)
+        if isinstance(value, dict) and self.query:
+            items = sorted(value.items())
+            if 'start_at' in self.query:
+                items = [(key, item) for key, item in items if key >= self.query['start_at']]
+            if 'limit_to_first' in self.query:
+                items = items[:self.query['limit_to_first']]
+            value = OrderedDict(items)
+        return FakeResponse(value)
+
+    def set(self, data, token=None):
+        self.store.write(self.parts, data, merge=False)
+        return data
+
+    def update(self, data, token=None):
+        if not self.parts:
+            # Multi-path update at the root: each key is a full path, all in one request
+            self.store._call()
+            for path, value in data.items():
+                self.store.write(_split(path), value, merge=False, call=False)
+        else:
+            self.store.write(self.parts, data, merge=True)
+        return data
+
+    def push(self, data, token=None):
+        key = self.generate_key()
+        self.store.write(self.parts + [key], data, merge=False)
+        return {'name': key}
+
+
+class FakeFirebaseException(Exception):
+    pass
+
+
+class FakeAuth:
+    def __init__(self, api_key=None, requests=None, credentials=None):
+        self.api_key = api_key
+        self.requests = requests
+        self.credentials = credentials
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def create_user_with_email_and_password(self, email, password):
+        with self.lock:
+            if email in self.users or len(password) < 6:
+                raise FakeFirebaseException('EMAIL_EXISTS or WEAK_PASSWORD')
+            self.users[email] = password
+        return {'localId': uuid.uuid4().hex, 'email': email}
+
+    def sign_in_with_email_and_password(self, email, password):
+        if self.users.get(email) != password:
+            raise FakeFirebaseException('INVALID_PASSWORD')
+        return {'localId': email, 'email': email, 'idToken': uuid.uuid4().hex,
+                'refreshToken': uuid.uuid4().hex}
+
+
+class FakeFirebase:
+    def __init__(self, config, store):
+        self.api_key = config.get('apiKey')
+        self.credentials = None
+        self.requests = None
+        self.store = store
+
+    def auth(self):
+        return FakeAuth(self.api_key, self.requests, self.credentials)
+
+    def database(self):
+        return FakeDatabase(self.store)
+
+
+def fake_questions(count, topic, offset=0):
+    return [{'title': f'{topic} question {offset + i} ({uuid.uuid4().hex[:8]})',
+             'options': ['one', 'two', 'three', 'four'], 'answer': str(1 + i % 4)}
+            for i in range(count)]
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, name, generation_config=None, latency=0.0):
+        self.name = name
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        match = re.match(r'Generate (\d+) (.*?) multiple-choice', prompt)
+        count, topic = (int(match.group(1)), match.group(2)) if match else (1, 'general')
+        text = json.dumps(fake_questions(count, topic))
+        if not stream:
+            time.sleep(self.latency)
+            return FakeChunk(text)
+
+        def chunks(size=64):
+            for start in range(0, len(text), size):
+                time.sleep(self.latency * size / len(text))
+                yield FakeChunk(text[start:start + size])
+        return chunks()
+
+
+def install(firebase_latency=0.0, gemini_latency=0.0):
+    # Returns the shared in-memory store so callers can inspect what was written
+    store = FakeStore(firebase_latency)
+
+    pyrebase = types.ModuleType('pyrebase')
+    pyrebase_inner = types.ModuleType('pyrebase.pyrebase')
+    pyrebase_inner.Auth = FakeAuth
+    pyrebase_inner.FirebaseException = FakeFirebaseException
+    pyrebase_inner.raise_detailed_error = lambda response: None
+    pyrebase.pyrebase = pyrebase_inner
+    pyrebase.initialize_app = lambda config: FakeFirebase(config, store)
+
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = lambda name, generation_config=None: FakeModel(name, generation_config,
+                                                                           gemini_latency)
+    google = sys.modules.get('google') or types.ModuleType('google')
+    google.generativeai = genai
+
+    sys.modules.update({'pyrebase': pyrebase, 'pyrebase.pyrebase': pyrebase_inner,
+                        'google': google, 'google.generativeai': genai})
+    return store
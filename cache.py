@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+READ_CACHE_SIZE = int(os.getenv('READ_CACHE_SIZE', '1024'))
+READ_CACHE_TTL = float(os.getenv('READ_CACHE_TTL', '30'))
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # Concurrent callers asking for the same key share one in-flight call
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        # Returns (result, shared) where shared is True for callers that
+        # waited on someone else's call
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+def paths_overlap(a, b):
+    # True when one Firebase path is the other, or an ancestor of it
+    return a == b or a.startswith(b + '/') or b.startswith(a + '/')
+
+
+class PathCache:
+    # Bounded read-through cache keyed by Firebase path (plus an optional
+    # query variant), with LRU eviction, a TTL and coalesced misses.
+    def __init__(self, max_entries=READ_CACHE_SIZE, ttl=READ_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, path, loader, variant=''):
+        key = (path, variant)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = self.version
+
+        value, shared = self.flight.do(key, loader)
+        with self.lock:
+            if shared:
+                self.coalesced += 1
+            # Don't cache a value that was loaded across an invalidation
+            elif version == self.version:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, path):
+        # Drops the path itself, everything cached below it and every cached
+        # ancestor that contains it
+        with self.lock:
+            self.version += 1
+            stale = [key for key in self.entries if paths_overlap(key[0], path)]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
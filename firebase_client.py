@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+
+import pyrebase
+import requests
+from pyrebase.pyrebase import Auth, raise_detailed_error
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+from admission import firebase_limit
+
+
+# One long-lived Firebase client per process. Every database and auth call
+# goes through a single pooled requests.Session, so keep-alive connections
+# and TLS sessions are reused across requests instead of reconnecting.
+load_dotenv()
+
+FIREBASE_POOL_SIZE = int(os.getenv('FIREBASE_POOL_SIZE', '20'))
+FIREBASE_CONNECT_TIMEOUT = float(os.getenv('FIREBASE_CONNECT_TIMEOUT', '3'))
+FIREBASE_READ_TIMEOUT = float(os.getenv('FIREBASE_READ_TIMEOUT', '10'))
+FIREBASE_RETRIES = int(os.getenv('FIREBASE_RETRIES', '3'))
+FIREBASE_BACKOFF = float(os.getenv('FIREBASE_BACKOFF', '0.2'))
+
+firebaseConfig = {
+    'apiKey': os.getenv('API_KEY'),
+    'authDomain': os.getenv('AUTH_DOMAIN'),
+    'projectId': os.getenv('PROJECT_ID'),
+    'storageBucket': os.getenv('STORAGE_BUCKET'),
+    'messagingSenderId': os.getenv('MESSAGING_SENDER_ID'),
+    'appId': os.getenv('APP_ID'),
+    'measurementId': os.getenv('MEASUREMENT_ID'),
+    'databaseURL': os.getenv('DATABASE_URL')
+}
+
+
+class CallStats:
+    # Per-call timing of outbound Firebase requests, keyed by HTTP method
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.listeners = []
+
+    def add_listener(self, listener):
+        # listener(method, seconds, ok) is called after every request
+        self.listeners.append(listener)
+
+    def record(self, method, seconds, ok):
+        with self.lock:
+            entry = self.calls.setdefault(method, {'count': 0, 'errors': 0, 'total_seconds': 0.0,
+                                                   'max_seconds': 0.0, 'last_seconds': 0.0})
+            entry['count'] += 1
+            entry['errors'] += 0 if ok else 1
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['last_seconds'] = seconds
+        for listener in self.listeners:
+            listener(method, seconds, ok)
+
+    def snapshot(self):
+        with self.lock:
+            return {method: dict(entry) for method, entry in self.calls.items()}
+
+
+call_stats = CallStats()
+
+
+class TimedSession(requests.Session):
+    # Applies a default timeout and the global Firebase concurrency limit,
+    # and records how long each call took
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with firebase_limit.slot():
+            start = time.perf_counter()
+            ok = False
+            try:
+                response = super().request(method, url, **kwargs)
+                ok = response.status_code < 400
+                return response
+            finally:
+                call_stats.record(method.upper(), time.perf_counter() - start, ok)
+
+
+def create_session():
+    session = TimedSession((FIREBASE_CONNECT_TIMEOUT, FIREBASE_READ_TIMEOUT))
+    # Only idempotent methods are retried on read errors or 5xx responses;
+    # connection failures are retried for every method.
+    retry = Retry(total=FIREBASE_RETRIES, backoff_factor=FIREBASE_BACKOFF,
+                  status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=FIREBASE_POOL_SIZE, pool_maxsize=FIREBASE_POOL_SIZE,
+                          max_retries=retry)
+    for scheme in ('http://', 'https://'):
+        session.mount(scheme, adapter)
+    return session
+
+
+class PooledAuth(Auth):
+    # pyrebase's Auth posts through the module-level requests API, which opens
+    # a fresh connection per call; these go through the shared session instead
+    # and don't keep the last signed-in user on a process-wide object.
+    def _post(self, url, payload):
+        request_object = self.requests.post(url, headers={"content-type": "application/json; charset=UTF-8"},
+                                            data=json.dumps(payload))
+        raise_detailed_error(request_object)
+        return request_object.json()
+
+    def sign_in_with_email_and_password(self, email, password):
+        return self._post(
+            f"https://www.googleapis.com/identitytoolkit/v3/relyingparty/verifyPassword?key={self.api_key}",
+            {"email": email, "password": password, "returnSecureToken": True})
+
+    def create_user_with_email_and_password(self, email, password):
+        return self._post(
+            f"https://www.googleapis.com/identitytoolkit/v3/relyingparty/signupNewUser?key={self.api_key}",
+            {"email": email, "password": password, "returnSecureToken": True})
+
+    def refresh(self, refresh_token):
+        response = self._post(f"https://securetoken.googleapis.com/v1/token?key={self.api_key}",
+                              {"grantType": "refresh_token", "refreshToken": refresh_token})
+        return {
+            "userId": response["user_id"],
+            "idToken": response["id_token"],
+            "refreshToken": response["refresh_token"]
+        }
+
+
+firebase = pyrebase.initialize_app(firebaseConfig)
+firebase.requests = create_session()
+auth = PooledAuth(firebase.api_key, firebase.requests, firebase.credentials)
+
+
+def database():
+    # pyrebase Database objects carry per-call path state, so hand out a new
+    # (cheap) one per call; they all share the pooled session.
+    return firebase.database()
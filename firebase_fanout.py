@@ -0,0 +1,70 @@
+import os
+
+from admission import Overloaded
+from green_io import fan_out
+
+
+# Largest roster written as one atomic multi-path update; bigger rosters are
+# split into chunks of this size and written concurrently.
+FANOUT_CHUNK_SIZE = int(os.getenv('FANOUT_CHUNK_SIZE', '100'))
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', '4'))
+
+
+def host_quiz_path(host, quiz_id, key):
+    return f"Users/{host}/Quizes Attended/{quiz_id}/{key}"
+
+
+def participant_quiz_path(user, quiz_id, key):
+    return f"Users/{user}/Your Quizes/{quiz_id}/{key}"
+
+
+def _write_chunk(database, updates, owners, shed=True):
+    # With `shed`, an Overloaded write is re-raised so the route answers 503
+    # and the client retries; without it, it fails the chunk's owners
+    try:
+        database().update(updates)
+        return {}
+    except Exception as e:
+        if shed and isinstance(e, Overloaded):
+            raise
+        return {owner: str(e) for owner in owners}
+
+
+def write_quiz_fanout(database, host, quiz_id, user_data, users, host_extra=None, key=None):
+    # Writes the host copy and every participant copy of a new quiz under one
+    # shared push key. `database` is a factory such as firebase.database,
+    # since pyrebase Database objects keep per-call path state.
+    # `host_extra(key)` may return further path -> value updates to write
+    # atomically with the host entry (e.g. the quiz index). `key` is the push
+    # key to write under, generated if not given.
+    # Returns (key, failures) where failures maps 'host' or a participant to
+    # the error message of the write that covered them.
+    key = key or database().generate_key()
+
+    host_updates = {host_quiz_path(host, quiz_id, key): user_data}
+    if host_extra:
+        host_updates.update(host_extra(key))
+    participant_updates = [(user, participant_quiz_path(user, quiz_id, key)) for user in users]
+
+    if len(participant_updates) <= FANOUT_CHUNK_SIZE:
+        updates = dict(host_updates)
+        updates.update({path: user_data for _, path in participant_updates})
+        return key, _write_chunk(database, updates, ['host'] + list(users))
+
+    # The host entry goes first on its own so a partial failure never leaves
+    # participant copies of a quiz the host can't see. Once it is written
+    # the quiz exists, so a shed participant chunk is reported as failed
+    # users rather than as a 503 that would orphan the host copy.
+    failures = _write_chunk(database, host_updates, ['host'])
+    if failures:
+        return key, failures
+
+    chunks = [participant_updates[i:i + FANOUT_CHUNK_SIZE]
+              for i in range(0, len(participant_updates), FANOUT_CHUNK_SIZE)]
+    results = fan_out(
+        lambda chunk: _write_chunk(database, {path: user_data for _, path in chunk},
+                                   [user for user, _ in chunk], shed=False),
+        chunks, limit=FANOUT_WORKERS)
+    for result in results:
+        failures.update(result)
+    return key, failures
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+
+from dotenv import load_dotenv
+
+
+# Cooperative I/O mode. ASYNC_MODE=eventlet|threading, or unset to pick
+# eventlet when it is installed and threading otherwise, as Flask-SocketIO
+# itself does. Under eventlet the process is monkey-patched as soon as this
+# module is imported (app.py and server.py import it before anything else),
+# so Firebase and Gemini calls yield to other green threads while they wait
+# on the network instead of holding a worker. Run it as a single eventlet
+# worker, e.g.
+#     gunicorn -k eventlet -w 1 app:app
+#
+# fan_out() overlaps independent outbound calls on green threads under
+# eventlet, or on a small thread pool otherwise. Each call site bounds its
+# own width; the global limits on concurrent Firebase and Gemini calls are
+# still enforced by admission.
+load_dotenv()
+
+ASYNC_MODE = os.getenv('ASYNC_MODE', '').lower() or None
+GREEN_POOL_SIZE = int(os.getenv('GREEN_POOL_SIZE', '16'))
+
+if ASYNC_MODE is None:
+    ASYNC_MODE = 'eventlet' if importlib.util.find_spec('eventlet') else 'threading'
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE != 'threading':
+    raise ValueError(f"Unsupported ASYNC_MODE {ASYNC_MODE!r}, use 'threading' or 'eventlet'")
+
+# Imported after patching so the pool picks up green threads
+from concurrent.futures import ThreadPoolExecutor
+
+GREEN = ASYNC_MODE == 'eventlet'
+
+
+def fan_out(fn, items, limit=GREEN_POOL_SIZE):
+    # fn(item) for every item, at most `limit` at a time; results in order.
+    # The first exception is re-raised, as with map().
+    items = list(items)
+    if len(items) <= 1 or limit <= 1:
+        return [fn(item) for item in items]
+    size = min(limit, len(items))
+    if GREEN:
+        return list(eventlet.GreenPool(size).imap(fn, items))
+    with ThreadPoolExecutor(max_workers=size) as executor:
+        return list(executor.map(fn, items))
+
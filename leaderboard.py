@@ -0,0 +1,177 @@
+import random
+
+
+# Indexable skip list: every forward link also stores how many level-0 nodes
+# it jumps over, so rank lookups and rank -> node lookups are O(log n).
+MAX_LEVEL = 24
+BRANCHING = 0.25
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.forward = [None] * level
+        self.width = [1] * level
+
+
+class RankedSkipList:
+    def __init__(self):
+        self.head = _Node(None, MAX_LEVEL)
+        self.level = 1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and random.random() < BRANCHING:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [self.head] * MAX_LEVEL
+        steps = [0] * MAX_LEVEL
+        node = self.head
+        position = 0
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                position += node.width[i]
+                node = node.forward[i]
+            update[i] = node
+            steps[i] = position
+
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                update[i] = self.head
+                steps[i] = 0
+                self.head.width[i] = self.size + 1
+            self.level = level
+
+        new_node = _Node(key, level)
+        for i in range(level):
+            prev = update[i]
+            skipped = position - steps[i]
+            new_node.forward[i] = prev.forward[i]
+            new_node.width[i] = prev.width[i] - skipped
+            prev.forward[i] = new_node
+            prev.width[i] = skipped + 1
+        for i in range(level, self.level):
+            update[i].width[i] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update = [self.head] * MAX_LEVEL
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        target = node.forward[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for i in range(self.level):
+            if update[i].forward[i] is target:
+                update[i].forward[i] = target.forward[i]
+                update[i].width[i] += target.width[i] - 1
+            else:
+                update[i].width[i] -= 1
+
+        while self.level > 1 and self.head.forward[self.level - 1] is None:
+            self.level -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        # 1-based position of key in ascending order
+        node = self.head
+        position = 0
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                position += node.width[i]
+                node = node.forward[i]
+        if node is self.head or node.key != key:
+            raise KeyError(key)
+        return position
+
+    def node_at(self, rank):
+        if rank < 1 or rank > self.size:
+            return None
+        node = self.head
+        position = 0
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and position + node.width[i] <= rank:
+                position += node.width[i]
+                node = node.forward[i]
+        return node
+
+    def iter_from(self, rank, count):
+        node = self.node_at(rank)
+        while node is not None and count > 0:
+            yield node.key
+            node = node.forward[0]
+            count -= 1
+
+
+class Leaderboard:
+    # Ranked by (-score, username), the same ordering the old heap used.
+    def __init__(self):
+        self.ranking = RankedSkipList()
+        self.candidate_map = {}
+
+    def __len__(self):
+        return len(self.candidate_map)
+
+    def add_candidate(self, username, score):
+        if username in self.candidate_map:
+            self.update_score(username, score)
+        else:
+            self.candidate_map[username] = score
+            self.ranking.insert((-score, username))
+
+    def update_score(self, username, new_score):
+        old_score = self.candidate_map[username]
+        if old_score == new_score:
+            return
+        self.ranking.remove((-old_score, username))
+        self.ranking.insert((-new_score, username))
+        self.candidate_map[username] = new_score
+
+    def remove_candidate(self, username):
+        score = self.candidate_map.pop(username)
+        self.ranking.remove((-score, username))
+
+    def clear(self):
+        self.ranking = RankedSkipList()
+        self.candidate_map = {}
+
+    def rank_of(self, username):
+        score = self.candidate_map.get(username)
+        if score is None:
+            return None
+        return self.ranking.rank((-score, username))
+
+    def get_top_candidates(self, n):
+        return [(username, -score) for score, username in self.ranking.iter_from(1, n)]
+
+    def get_around(self, username, k):
+        # Players ranked up to k places above and below username
+        rank = self.rank_of(username)
+        if rank is None:
+            return None, []
+        start = max(1, rank - k)
+        window = self.ranking.iter_from(start, rank - start + k + 1)
+        return rank, [(start + offset, name, -score)
+                      for offset, (score, name) in enumerate(window)]
+
+    def get_all_scores(self):
+        return self.get_top_candidates(len(self.ranking))
+
+    def print_leaderboard(self):
+        print("Leaderboard:")
+        for rank, (username, score) in enumerate(self.get_all_scores(), start=1):
+            print(f"Rank {rank}: {username} with score {score}")
@@ -0,0 +1,105 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+
+# Logging for the web processes. Handlers only enqueue records; one
+# background listener thread does the formatting and stdout writes, so a
+# slow terminal or log collector never stalls a request or socket handler.
+#
+# LOG_LEVEL         root level (default INFO)
+# LOG_LEVELS        per-module overrides, e.g. "app=DEBUG,firebase_client=WARNING"
+# LOG_DEBUG_SAMPLE  fraction of DEBUG records kept (default 1.0)
+# LOG_DEBUG_RATE    max DEBUG records per second per call site, 0 = unlimited
+#
+# Always log with %-style arguments (logger.debug('scores %s', scores)) so
+# nothing is formatted unless the level is enabled and the record survives
+# sampling.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_DEBUG_SAMPLE = float(os.getenv('LOG_DEBUG_SAMPLE', '1.0'))
+LOG_DEBUG_RATE = int(os.getenv('LOG_DEBUG_RATE', '20'))
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+
+
+def parse_levels(spec):
+    # "a=DEBUG, b.c=warning" -> {'a': 'DEBUG', 'b.c': 'WARNING'}
+    levels = {}
+    for item in spec.split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message in the caller's thread so the
+    # record can be pickled; our queue is in-process, so the record is queued
+    # as is and the listener formats it. Arguments are formatted late, so
+    # don't log objects that are mutated right after the call.
+    def prepare(self, record):
+        return record
+
+
+class DebugSampler(logging.Filter):
+    # Samples and rate-limits DEBUG records before they are queued. The rate
+    # limit is keyed on the unformatted message template, so one chatty call
+    # site cannot crowd out the others. Counters are not locked; an
+    # occasional extra or missing record is fine for debug output.
+    def __init__(self, sample=LOG_DEBUG_SAMPLE, per_second=LOG_DEBUG_RATE):
+        super().__init__()
+        self.sample = sample
+        self.per_second = per_second
+        self.window = 0
+        self.counts = {}
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample < 1 and random.random() >= self.sample:
+            self.dropped += 1
+            return False
+        if self.per_second:
+            second = int(record.created)
+            if second != self.window:
+                self.window = second
+                self.counts = {}
+            key = (record.name, record.msg)
+            count = self.counts.get(key, 0)
+            if count >= self.per_second:
+                self.dropped += 1
+                return False
+            self.counts[key] = count + 1
+        return True
+
+
+def setup_logging(level=None, levels=None, stream=None):
+    # Idempotent; call once at process start
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(records)
+    queue_handler.addFilter(DebugSampler())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel((level or LOG_LEVEL).upper())
+    for name, module_level in parse_levels(levels if levels is not None else LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
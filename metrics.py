@@ -0,0 +1,199 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, g, request
+
+
+# Minimal Prometheus text-format metrics. Recording an observation is a
+# bisect plus three increments under a per-series lock, so it is cheap
+# enough for submit_answer; gauges are callbacks evaluated only on scrape.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Series:
+    __slots__ = ('lock', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            with self.lock:
+                series = self.series.setdefault(labels, _Series(self.buckets))
+        index = bisect_left(self.buckets, value)
+        with series.lock:
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - start)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, series in list(self.series.items()):
+            with series.lock:
+                counts = list(series.counts)
+                total, count = series.sum, series.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Gauge:
+    # `collect()` returns a number, or a {label values tuple: number} dict
+    def __init__(self, name, help, collect, labelnames=()):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            value = self.collect()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for labels, sample in value.items():
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {sample}')
+        else:
+            lines.append(f'{self.name} {value}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in values.items():
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, collect, labelnames=()):
+        return self.register(Gauge(name, help, collect, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    'http_request_seconds', 'Flask route latency', ('route', 'method', 'status')))
+socketio_event_seconds = registry.register(Histogram(
+    'socketio_event_seconds', 'Socket.IO handler latency', ('event',)))
+firebase_request_seconds = registry.register(Histogram(
+    'firebase_request_seconds', 'Outbound Firebase call latency', ('method', 'ok')))
+gemini_request_seconds = registry.register(Histogram(
+    'gemini_request_seconds', 'Gemini generate_content latency', ('mode',)))
+
+
+class ConnectionCount:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def add(self, amount):
+        with self.lock:
+            self.value += amount
+
+
+connected_sockets = ConnectionCount()
+registry.gauge('socketio_connected_sockets', 'Connected Socket.IO clients', lambda: connected_sockets.value)
+
+
+def timed_event(event):
+    # Decorator for Socket.IO handlers; apply below @socketio.on(...)
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                socketio_event_seconds.observe((event,), time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            # Route templates, not raw paths, keep label cardinality bounded
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            http_request_seconds.observe((route, request.method, str(response.status_code)),
+                                         time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
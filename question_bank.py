@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from sqlite_db import SQLiteDatabase
+
+
+# Local bank of every generated or host-authored MCQ, de-duplicated by a hash
+# of the normalized title and indexed by topic (exact, then full-text), so
+# generation requests can be served without calling the model.
+QUESTION_BANK_PATH = os.getenv('QUESTION_BANK_PATH', 'question_bank.sqlite3')
+
+BANK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    hash TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    title TEXT NOT NULL,
+    options TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_topic ON questions (topic);
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(hash UNINDEXED, topic, title);
+"""
+
+
+def normalize_title(title):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', title.lower()).split())
+
+
+def question_hash(question):
+    return hashlib.sha1(normalize_title(question['title']).encode('utf-8')).hexdigest()
+
+
+def dedupe(questions, seen=None):
+    # Drops questions whose normalized title is already in `seen` (or earlier
+    # in the list) and records the kept ones in `seen`
+    seen = set() if seen is None else seen
+    unique = []
+    for question in questions:
+        digest = question_hash(question)
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(question)
+    return unique
+
+
+def _topic_query(topic):
+    # Every word of the topic has to appear in the stored topic
+    words = re.findall(r'\w+', topic)
+    return ' AND '.join(f'topic : "{word}"' for word in words)
+
+
+class QuestionBank:
+    def __init__(self, path=QUESTION_BANK_PATH):
+        self.db = SQLiteDatabase(path, BANK_SCHEMA)
+        self.served = 0
+
+    def add(self, questions, topic, source):
+        # Expects validated questions; returns how many were new
+        added = 0
+        now = time.time()
+        with self.db.transaction() as connection:
+            for question in questions:
+                digest = question_hash(question)
+                inserted = connection.execute(
+                    'INSERT OR IGNORE INTO questions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (digest, topic, question['title'], json.dumps(question['options']),
+                     question['answer'], source, now)).rowcount
+                if inserted:
+                    connection.execute('INSERT INTO questions_fts VALUES (?, ?, ?)',
+                                       (digest, topic, question['title']))
+                    added += 1
+        return added
+
+    def take(self, topic, count, exclude=()):
+        # Up to `count` random questions on `topic`, skipping hashes in `exclude`
+        exclude = set(exclude)
+        rows = self.db.execute(
+            'SELECT hash, title, options, answer FROM questions WHERE topic = ? ORDER BY random() LIMIT ?',
+            (topic, count + len(exclude)))
+        found = [row for row in rows if row[0] not in exclude][:count]
+
+        query = _topic_query(topic)
+        if len(found) < count and query:
+            seen = exclude | {row[0] for row in found}
+            rows = self.db.execute(
+                'SELECT q.hash, q.title, q.options, q.answer FROM questions_fts f '
+                'JOIN questions q ON q.hash = f.hash '
+                'WHERE questions_fts MATCH ? AND q.topic != ? ORDER BY random() LIMIT ?',
+                (query, topic, count - len(found) + len(seen)))
+            found += [row for row in rows if row[0] not in seen][:count - len(found)]
+
+        self.served += len(found)
+        return [{'title': title, 'options': json.loads(options), 'answer': answer}
+                for _, title, options, answer in found]
+
+    def stats(self):
+        return {'questions': self.db.execute('SELECT COUNT(*) FROM questions')[0][0],
+                'served': self.served}
@@ -0,0 +1,73 @@
+import json
+import os
+
+
+# Key-ordered, cursor-paginated reads of a user's 'Your Quizes' subtree.
+# Pages are fetched from Firebase in batches of READ_PAGE_BATCH entries and
+# written to the response as they arrive, so worker memory is bounded by the
+# batch size rather than the length of the user's history.
+READ_PAGE_BATCH = int(os.getenv('READ_PAGE_BATCH', '50'))
+MAX_READ_PAGE = int(os.getenv('MAX_READ_PAGE', '500'))
+
+
+def history_path(username):
+    return f"Users/{username}/Your Quizes"
+
+
+def fetch_batch(database, read_cache, username, after, count, summary=False):
+    # Up to `count` (quiz_id, item) pairs with keys strictly after `after`,
+    # each item already in its response shape. Only summary pages are cached:
+    # full entries carry every question, and caching them would make memory
+    # grow with the length of users' histories again.
+    path = history_path(username)
+
+    def load():
+        query = database().child(path).order_by_key()
+        if after is not None:
+            # startAt is inclusive, so ask for one extra and drop the cursor
+            query = query.start_at(after)
+        rows = query.limit_to_first(count + (after is not None)).get().each() or []
+        return [(row.key(), response_item(row.key(), row.val(), summary))
+                for row in rows if row.key() != after][:count]
+
+    if not summary:
+        return load()
+    return read_cache.get_or_load(path, load, variant=f"summary:{after}:{count}")
+
+
+def summarize(quiz_id, entry):
+    # entry is {push_key: quiz_data}; drop the question list
+    quiz = next(iter(entry.values()), {}) if isinstance(entry, dict) else {}
+    return {
+        'quiz_id': quiz_id,
+        'title': quiz.get('title'),
+        'status': quiz.get('status'),
+        'winner': quiz.get('winner'),
+    }
+
+
+def response_item(quiz_id, entry, summary):
+    return summarize(quiz_id, entry) if summary else {'quiz_id': quiz_id, 'quiz': entry}
+
+
+def stream_page(database, read_cache, username, cursor, limit, summary, first_batch):
+    # Yields the JSON response body piece by piece. `first_batch` (the first
+    # min(READ_PAGE_BATCH, limit) entries) is fetched by the caller so
+    # Firebase errors still map to a status code.
+    yield '{"message": "Data fetched successfully!", "data": ['
+    batch = first_batch
+    requested = min(READ_PAGE_BATCH, limit)
+    sent = 0
+    last_key = cursor
+    while True:
+        for quiz_id, item in batch:
+            yield (',' if sent else '') + json.dumps(item)
+            sent += 1
+            last_key = quiz_id
+        if len(batch) < requested or sent >= limit:
+            break
+        requested = min(READ_PAGE_BATCH, limit - sent)
+        batch = fetch_batch(database, read_cache, username, last_key, requested, summary)
+
+    next_cursor = last_key if sent >= limit else None
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
@@ -0,0 +1,17 @@
+# quiz_id -> (host, path) index kept at QuizIndex/<quiz_id>, written in the
+# same multi-path update that creates the quiz, so /quiz_data can read the
+# single quiz node instead of the host's whole history.
+
+def index_path(quiz_id):
+    return f"QuizIndex/{quiz_id}"
+
+
+def index_entry(host, path):
+    return {'host': host, 'path': path}
+
+
+def legacy_host(quiz_id):
+    # Quizzes created before the index: ids were f"{host}quiz{n}", so split on
+    # the last "quiz" (hosts may contain "quiz" themselves). Newer ids end in
+    # a push key and are always found in the index.
+    return quiz_id.rsplit('quiz', 1)[0]
@@ -0,0 +1,204 @@
+import atexit
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from answer_ledger import QuizLedger
+
+
+# Incremental snapshots of the in-process quiz store, so a restart or a
+# woken-up idle instance keeps its in-progress games.
+#
+# The file is a magic header followed by length-prefixed records: a full
+# copy of one quiz (key, info JSON, QuizLedger.dump()) or a tombstone for a
+# deleted quiz. Every QUIZ_SNAPSHOT_INTERVAL seconds the quizzes changed
+# since the last pass are appended; the latest record for a key wins. Once
+# the file has grown well past its live size it is rewritten.
+#
+# On startup the file is memory-mapped and only the record keys are scanned,
+# so the store is usable at once; each quiz is decoded the first time it is
+# touched (MemoryQuizStore's loader hook).
+#
+# A snapshot belongs to one process, which holds an exclusive lock on
+# QUIZ_SNAPSHOT_PATH.lock while it runs; with several workers only the first
+# one snapshots, the others run without (SnapshotInUse). Multi-worker
+# deployments should use QUIZ_STORE=sqlite instead.
+QUIZ_SNAPSHOT_PATH = os.getenv('QUIZ_SNAPSHOT_PATH', 'quiz_state.snap')
+QUIZ_SNAPSHOT_INTERVAL = float(os.getenv('QUIZ_SNAPSHOT_INTERVAL', '2'))
+
+MAGIC = b'QSNP\x01'
+QUIZ_RECORD = 1
+TOMBSTONE = 2
+RECORD_HEADER = struct.Struct('>IB')
+KEY_HEADER = struct.Struct('>HH')
+MIN_COMPACT_BYTES = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotInUse(Exception):
+    pass
+
+
+def encode_key(host, quiz_id):
+    host, quiz_id = host.encode('utf-8'), quiz_id.encode('utf-8')
+    return KEY_HEADER.pack(len(host), len(quiz_id)) + host + quiz_id
+
+
+def decode_key(data, offset):
+    # Returns ((host, quiz_id), offset just past the key)
+    host_length, quiz_length = KEY_HEADER.unpack_from(data, offset)
+    offset += KEY_HEADER.size
+    host = bytes(data[offset:offset + host_length]).decode('utf-8')
+    quiz_id = bytes(data[offset + host_length:offset + host_length + quiz_length]).decode('utf-8')
+    return (host, quiz_id), offset + host_length + quiz_length
+
+
+def encode_record(kind, key, quiz=None):
+    body = encode_key(*key)
+    if kind == QUIZ_RECORD:
+        info = json.dumps(quiz['info']).encode('utf-8')
+        body += struct.pack('>I', len(info)) + info + quiz['ledger']
+    return RECORD_HEADER.pack(len(body), kind) + body
+
+
+class QuizSnapshot:
+    def __init__(self, path=QUIZ_SNAPSHOT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = {}
+        self.map = None
+        self.live_bytes = 0
+        self._lock()
+        self._open()
+
+    def _lock(self):
+        # Held until the process exits; a second writer would interleave records
+        self.lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            raise SnapshotInUse(f"{self.path} is in use by another process")
+
+    def _open(self):
+        # Scans record keys only; truncates a torn record left by a crash
+        end = len(MAGIC)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > len(MAGIC):
+            with open(self.path, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not a quiz snapshot")
+            while end + RECORD_HEADER.size <= len(self.map):
+                length, kind = RECORD_HEADER.unpack_from(self.map, end)
+                body = end + RECORD_HEADER.size
+                if body + length > len(self.map):
+                    break
+                key, _ = decode_key(self.map, body)
+                if kind == QUIZ_RECORD:
+                    self.index[key] = (body, length)
+                else:
+                    self.index.pop(key, None)
+                end = body + length
+            self.live_bytes = sum(length for _, length in self.index.values())
+
+        self.file = open(self.path, 'r+b' if os.path.exists(self.path) else 'w+b')
+        self.file.truncate(end)
+        self.file.seek(0)
+        self.file.write(MAGIC)
+        self.file.seek(end)
+
+    # Loader hook used by MemoryQuizStore for quizzes not yet in memory
+
+    def has(self, host, quiz_id):
+        return (host, quiz_id) in self.index
+
+    def keys(self):
+        return list(self.index)
+
+    def discard(self, host, quiz_id):
+        self.index.pop((host, quiz_id), None)
+
+    def load(self, host, quiz_id):
+        location = self.index.get((host, quiz_id))
+        if location is None:
+            return None
+        body, length = location
+        data = memoryview(self.map)[body:body + length]
+        try:
+            _, offset = decode_key(data, 0)
+            (info_length,) = struct.unpack_from('>I', data, offset)
+            info = json.loads(bytes(data[offset + 4:offset + 4 + info_length]))
+            ledger = QuizLedger.load(data[offset + 4 + info_length:])
+        finally:
+            data.release()
+        self.discard(host, quiz_id)
+        return {'ledger': ledger, 'info': info}
+
+    # Writer side
+
+    def append(self, changed, deleted):
+        # changed: {key: {'ledger': bytes, 'info': dict}}, deleted: keys
+        records = [encode_record(TOMBSTONE, key) for key in deleted]
+        records += [encode_record(QUIZ_RECORD, key, quiz) for key, quiz in changed.items()]
+        if not records:
+            return
+        with self.lock:
+            self.file.write(b''.join(records))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def needs_compaction(self):
+        # Only once every quiz from the previous run has been loaded or dropped,
+        # so a rewrite never has to copy undecoded records
+        return not self.index and self.file.tell() > max(MIN_COMPACT_BYTES, 4 * self.live_bytes)
+
+    def rewrite(self, quizzes):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            for key, quiz in quizzes.items():
+                f.write(encode_record(QUIZ_RECORD, key, quiz))
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            self.file.close()
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            os.replace(temporary, self.path)
+            self.file = open(self.path, 'r+b')
+            self.file.seek(0, os.SEEK_END)
+            self.live_bytes = self.file.tell()
+
+
+def start_snapshots(socketio, store, interval=QUIZ_SNAPSHOT_INTERVAL):
+    # Periodically appends the store's changes; no-op for stores without a
+    # snapshot loader (e.g. SQLite, which is already durable)
+    snapshot = getattr(store, 'loader', None)
+    if not isinstance(snapshot, QuizSnapshot):
+        return None
+
+    def flush():
+        changed, deleted = store.take_changes()
+        snapshot.append(changed, deleted)
+        if snapshot.needs_compaction():
+            snapshot.rewrite(store.dump_all())
+
+    def run():
+        while True:
+            socketio.sleep(interval)
+            try:
+                flush()
+            except Exception as e:
+                logger.error("Quiz snapshot failed: %s", e)
+
+    if snapshot.index:
+        logger.info("Restoring %d quizzes lazily from %s", len(snapshot.index), snapshot.path)
+    socketio.start_background_task(run)
+    atexit.register(flush)
+    return snapshot
@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from answer_ledger import QuizLedger
+from quiz_snapshot import QUIZ_SNAPSHOT_PATH, QuizSnapshot, SnapshotInUse
+from sqlite_db import SQLiteDatabase
+
+
+# Live quiz state behind one interface so it can be kept in-process (single
+# worker) or in a shared SQLite database that every gunicorn worker on the
+# host opens. Selected with QUIZ_STORE=memory|sqlite.
+#
+# With a shared store every worker arms timers for every quiz, so the last
+# activity is kept in the store and ending a quiz is claimed there first:
+# whichever worker claims it writes the one result.
+ACTIVITY_RESOLUTION = 30
+FINISH_CLAIM_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class QuizStore:
+    def create_quiz(self, host, quiz_id, users, number_of_questions, info):
+        raise NotImplementedError
+
+    def has_quiz(self, host, quiz_id):
+        raise NotImplementedError
+
+    def touch(self, host, quiz_id):
+        # Notes activity where every process can see it (shared stores only)
+        raise NotImplementedError
+
+    def last_active(self, host, quiz_id):
+        # Latest activity any process recorded, or None if the store isn't shared
+        raise NotImplementedError
+
+    def claim_finish(self, host, quiz_id):
+        # True for exactly one caller that may write the quiz's result; a claim
+        # left by a crashed process lapses after FINISH_CLAIM_SECONDS
+        raise NotImplementedError
+
+    def release_finish(self, host, quiz_id):
+        raise NotImplementedError
+
+    def get_info(self, host, quiz_id):
+        raise NotImplementedError
+
+    def record_answer(self, host, quiz_id, username, question_index, is_correct):
+        raise NotImplementedError
+
+    def scores(self, host, quiz_id):
+        raise NotImplementedError
+
+    def delete_quiz(self, host, quiz_id):
+        raise NotImplementedError
+
+    def live_quizzes(self):
+        raise NotImplementedError
+
+
+class MemoryQuizStore(QuizStore):
+    # `loader` (optional) supplies quizzes restored from a snapshot that are
+    # not in memory yet: has/load/discard(host, quiz_id), count(host), keys().
+    # Changes are tracked for incremental snapshots (take_changes).
+    def __init__(self, loader=None):
+        self.quiz_map = {}
+        self.lock = threading.Lock()
+        self.loader = loader
+        self.dirty = set()
+        self.deleted = set()
+        self.finishing = set()
+
+    def _quiz(self, host, quiz_id):
+        quiz = self.quiz_map.get(host, {}).get(quiz_id)
+        if quiz is None and self.loader is not None and self.loader.has(host, quiz_id):
+            with self.lock:
+                quiz = self.quiz_map.get(host, {}).get(quiz_id)
+                if quiz is None:
+                    quiz = self.loader.load(host, quiz_id)
+                    if quiz is not None:
+                        self.quiz_map.setdefault(host, {})[quiz_id] = quiz
+        return quiz
+
+    def create_quiz(self, host, quiz_id, users, number_of_questions, info):
+        ledger = QuizLedger(number_of_questions)
+        for user in users:
+            ledger.add_user(user)
+        with self.lock:
+            if self.loader is not None:
+                self.loader.discard(host, quiz_id)
+            self.quiz_map.setdefault(host, {})[quiz_id] = {'ledger': ledger, 'info': dict(info)}
+            self.dirty.add((host, quiz_id))
+
+    def has_quiz(self, host, quiz_id):
+        return self._quiz(host, quiz_id) is not None
+
+    def touch(self, host, quiz_id):
+        pass
+
+    def last_active(self, host, quiz_id):
+        # Only this process sees the quiz; its scheduler already knows
+        return None
+
+    def claim_finish(self, host, quiz_id):
+        if self._quiz(host, quiz_id) is None:
+            return False
+        with self.lock:
+            if (host, quiz_id) in self.finishing:
+                return False
+            self.finishing.add((host, quiz_id))
+            return True
+
+    def release_finish(self, host, quiz_id):
+        with self.lock:
+            self.finishing.discard((host, quiz_id))
+
+    def get_info(self, host, quiz_id):
+        quiz = self._quiz(host, quiz_id)
+        return None if quiz is None else dict(quiz['info'])
+
+    def record_answer(self, host, quiz_id, username, question_index, is_correct):
+        quiz = self._quiz(host, quiz_id)
+        if quiz is None:
+            return False
+        with self.lock:
+            recorded = quiz['ledger'].record(username, question_index, is_correct)
+            if recorded:
+                self.dirty.add((host, quiz_id))
+            return recorded
+
+    def scores(self, host, quiz_id):
+        quiz = self._quiz(host, quiz_id)
+        return None if quiz is None else quiz['ledger'].scores()
+
+    def delete_quiz(self, host, quiz_id):
+        with self.lock:
+            if self.loader is not None:
+                self.loader.discard(host, quiz_id)
+            quizzes = self.quiz_map.get(host)
+            if quizzes is not None:
+                quizzes.pop(quiz_id, None)
+                if not quizzes:
+                    del self.quiz_map[host]
+            self.dirty.discard((host, quiz_id))
+            self.finishing.discard((host, quiz_id))
+            if self.loader is not None:
+                self.deleted.add((host, quiz_id))
+
+    def live_quizzes(self):
+        restored = self.loader.keys() if self.loader is not None else []
+        return [(host, quiz_id) for host, quizzes in list(self.quiz_map.items())
+                for quiz_id in list(quizzes)] + restored
+
+    def take_changes(self):
+        # ({key: serialized quiz}, deleted keys) since the previous call
+        with self.lock:
+            changed = {}
+            for host, quiz_id in self.dirty:
+                quiz = self.quiz_map.get(host, {}).get(quiz_id)
+                if quiz is not None:
+                    changed[(host, quiz_id)] = {'ledger': quiz['ledger'].dump(), 'info': quiz['info']}
+            deleted = [key for key in self.deleted if key not in changed]
+            self.dirty.clear()
+            self.deleted.clear()
+        return changed, deleted
+
+    def dump_all(self):
+        with self.lock:
+            return {(host, quiz_id): {'ledger': quiz['ledger'].dump(), 'info': quiz['info']}
+                    for host, quizzes in self.quiz_map.items() for quiz_id, quiz in quizzes.items()}
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    host TEXT NOT NULL,
+    quiz_id TEXT NOT NULL,
+    number_of_questions INTEGER NOT NULL,
+    info TEXT NOT NULL,
+    PRIMARY KEY (host, quiz_id)
+);
+CREATE TABLE IF NOT EXISTS players (
+    host TEXT NOT NULL,
+    quiz_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (host, quiz_id, username)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS answers (
+    host TEXT NOT NULL,
+    quiz_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    question_index INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (host, quiz_id, username, question_index)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteQuizStore(QuizStore):
+    def __init__(self, path):
+        self.db = SQLiteDatabase(path, SQLITE_SCHEMA)
+
+    def create_quiz(self, host, quiz_id, users, number_of_questions, info):
+        info = dict(info, last_active=time.time())
+        with self.db.transaction() as connection:
+            connection.execute('DELETE FROM players WHERE host = ? AND quiz_id = ?', (host, quiz_id))
+            connection.execute('DELETE FROM answers WHERE host = ? AND quiz_id = ?', (host, quiz_id))
+            connection.execute('INSERT OR REPLACE INTO quizzes VALUES (?, ?, ?, ?)',
+                               (host, quiz_id, number_of_questions, json.dumps(info)))
+            connection.executemany('INSERT OR IGNORE INTO players VALUES (?, ?, ?, 0)',
+                                   [(host, quiz_id, user) for user in users])
+
+    def has_quiz(self, host, quiz_id):
+        return bool(self.db.execute('SELECT 1 FROM quizzes WHERE host = ? AND quiz_id = ?',
+                                    (host, quiz_id)))
+
+    def get_info(self, host, quiz_id):
+        rows = self.db.execute('SELECT info FROM quizzes WHERE host = ? AND quiz_id = ?', (host, quiz_id))
+        return json.loads(rows[0][0]) if rows else None
+
+    def _touch(self, connection, host, quiz_id):
+        # At most one write per ACTIVITY_RESOLUTION seconds per quiz
+        now = time.time()
+        connection.execute(
+            "UPDATE quizzes SET info = json_set(info, '$.last_active', ?) WHERE host = ? AND quiz_id = ? "
+            "AND COALESCE(json_extract(info, '$.last_active'), 0) < ?",
+            (now, host, quiz_id, now - ACTIVITY_RESOLUTION))
+
+    def touch(self, host, quiz_id):
+        with self.db.transaction() as connection:
+            self._touch(connection, host, quiz_id)
+
+    def last_active(self, host, quiz_id):
+        rows = self.db.execute("SELECT json_extract(info, '$.last_active') FROM quizzes "
+                               "WHERE host = ? AND quiz_id = ?", (host, quiz_id))
+        return rows[0][0] if rows else None
+
+    def claim_finish(self, host, quiz_id):
+        now = time.time()
+        with self.db.transaction() as connection:
+            return connection.execute(
+                "UPDATE quizzes SET info = json_set(info, '$.finishing', ?) WHERE host = ? AND quiz_id = ? "
+                "AND COALESCE(json_extract(info, '$.finishing'), 0) < ?",
+                (now, host, quiz_id, now - FINISH_CLAIM_SECONDS)).rowcount == 1
+
+    def release_finish(self, host, quiz_id):
+        self.db.execute("UPDATE quizzes SET info = json_remove(info, '$.finishing') "
+                        "WHERE host = ? AND quiz_id = ?", (host, quiz_id))
+
+    def record_answer(self, host, quiz_id, username, question_index, is_correct):
+        with self.db.transaction() as connection:
+            row = connection.execute(
+                'SELECT number_of_questions FROM quizzes WHERE host = ? AND quiz_id = ?',
+                (host, quiz_id)).fetchone()
+            if (row is None or not isinstance(question_index, int)
+                    or not 0 <= question_index < row[0]):
+                return False
+            # The primary key on answers rejects a resent answer
+            inserted = connection.execute(
+                'INSERT OR IGNORE INTO answers VALUES (?, ?, ?, ?, ?)',
+                (host, quiz_id, username, question_index, int(bool(is_correct)))).rowcount
+            connection.execute(
+                'INSERT INTO players VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (host, quiz_id, username) DO UPDATE SET total = total + excluded.total',
+                (host, quiz_id, username, int(bool(inserted and is_correct))))
+            if inserted:
+                self._touch(connection, host, quiz_id)
+            return bool(inserted)
+
+    def scores(self, host, quiz_id):
+        if not self.has_quiz(host, quiz_id):
+            return None
+        rows = self.db.execute('SELECT username, total FROM players WHERE host = ? AND quiz_id = ?',
+                               (host, quiz_id))
+        return dict(rows)
+
+    def delete_quiz(self, host, quiz_id):
+        with self.db.transaction() as connection:
+            for table in ('answers', 'players', 'quizzes'):
+                connection.execute(f'DELETE FROM {table} WHERE host = ? AND quiz_id = ?',
+                                   (host, quiz_id))
+
+    def live_quizzes(self):
+        return self.db.execute('SELECT host, quiz_id FROM quizzes')
+
+
+def create_quiz_store(kind=None, path=None):
+    kind = kind or os.getenv('QUIZ_STORE', 'memory')
+    if kind == 'memory':
+        # Snapshotted to QUIZ_SNAPSHOT_PATH unless it is set to ''
+        snapshot_path = path if path is not None else QUIZ_SNAPSHOT_PATH
+        if not snapshot_path:
+            return MemoryQuizStore()
+        try:
+            return MemoryQuizStore(loader=QuizSnapshot(snapshot_path))
+        except SnapshotInUse as e:
+            logger.warning("%s, quiz snapshots are disabled in this process", e)
+            return MemoryQuizStore()
+    if kind == 'sqlite':
+        return SQLiteQuizStore(path or os.getenv('QUIZ_STORE_PATH', 'quiz_state.sqlite3'))
+    raise ValueError(f"Unknown QUIZ_STORE backend: {kind}")
@@ -0,0 +1,142 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+
+# Quiz deadlines and idle eviction on one background task. Deadlines live in
+# a min-heap (O(log n) to schedule); cancelled or superseded entries are left
+# in place and skipped when they surface. Activity only updates a timestamp,
+# and an idle entry that fires early is pushed back to the real idle
+# deadline, so touching a quiz stays O(1).
+#
+# A quiz's `time` from /add_data is in QUIZ_TIME_UNIT seconds (minutes by
+# default) and gets QUIZ_TIME_GRACE seconds for late answers. Quizzes with
+# no activity for QUIZ_IDLE_TIMEOUT seconds are ended as abandoned.
+QUIZ_TIME_UNIT = float(os.getenv('QUIZ_TIME_UNIT', '60'))
+QUIZ_TIME_GRACE = float(os.getenv('QUIZ_TIME_GRACE', '5'))
+QUIZ_IDLE_TIMEOUT = float(os.getenv('QUIZ_IDLE_TIMEOUT', str(30 * 60)))
+QUIZ_TICK_SECONDS = float(os.getenv('QUIZ_TICK_SECONDS', '5'))
+
+logger = logging.getLogger(__name__)
+
+
+def quiz_deadline(duration, now=None):
+    # Wall-clock deadline for a quiz of `duration` time units starting now
+    return (now or time.time()) + duration * QUIZ_TIME_UNIT + QUIZ_TIME_GRACE
+
+
+class QuizScheduler:
+    def __init__(self, socketio, on_expire, on_tick=None, tick_interval=QUIZ_TICK_SECONDS,
+                 idle_timeout=QUIZ_IDLE_TIMEOUT):
+        # on_expire(key, reason) with reason 'time_up' or 'abandoned';
+        # on_tick(key, seconds_remaining) every tick for quizzes with a deadline
+        self.socketio = socketio
+        self.on_expire = on_expire
+        self.on_tick = on_tick
+        self.tick_interval = tick_interval
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.heap = []
+        self.quizzes = {}
+        self.generations = itertools.count()
+        self.started = False
+        self.expired = {'time_up': 0, 'abandoned': 0}
+
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        self.socketio.start_background_task(self._run)
+
+    def schedule(self, key, deadline=None, last_active=None):
+        # (Re)tracks a quiz; `deadline` is a time.time() value or None for
+        # idle eviction only, `last_active` defaults to now. Returns the deadline.
+        self._start()
+        last_active = last_active or time.time()
+        generation = next(self.generations)
+        with self.lock:
+            self.quizzes[key] = {'deadline': deadline, 'last_active': last_active, 'generation': generation}
+            if deadline is not None:
+                heapq.heappush(self.heap, (deadline, generation, 'time_up', key))
+            heapq.heappush(self.heap, (last_active + self.idle_timeout, generation, 'abandoned', key))
+            self._compact()
+        return deadline
+
+    def touch(self, key):
+        # Activity on an untracked quiz (ended, or never scheduled) is ignored
+        quiz = self.quizzes.get(key)
+        if quiz is not None:
+            quiz['last_active'] = time.time()
+
+    def is_idle(self, last_active):
+        return last_active + self.idle_timeout <= time.time()
+
+    def cancel(self, key):
+        with self.lock:
+            self.quizzes.pop(key, None)
+
+    def remaining(self, key):
+        quiz = self.quizzes.get(key)
+        if quiz is None or quiz['deadline'] is None:
+            return None
+        return max(0.0, quiz['deadline'] - time.time())
+
+    def _compact(self):
+        # Drops stale entries once they dominate the heap
+        if len(self.heap) > 2 * (2 * len(self.quizzes) + 32):
+            self.heap = [entry for entry in self.heap
+                         if entry[3] in self.quizzes and self.quizzes[entry[3]]['generation'] == entry[1]]
+            heapq.heapify(self.heap)
+
+    def _due(self, now):
+        # Pops everything due by `now`; returns [(key, reason)] to expire
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                when, generation, reason, key = heapq.heappop(self.heap)
+                quiz = self.quizzes.get(key)
+                if quiz is None or quiz['generation'] != generation:
+                    continue
+                if reason == 'abandoned' and quiz['last_active'] + self.idle_timeout > now:
+                    heapq.heappush(self.heap, (quiz['last_active'] + self.idle_timeout, generation, reason, key))
+                    continue
+                del self.quizzes[key]
+                self.expired[reason] += 1
+                due.append((key, reason))
+        return due
+
+    def _run(self):
+        next_tick = time.time() + self.tick_interval
+        while True:
+            now = time.time()
+            for key, reason in self._due(now):
+                # One failing quiz must not stop the task that ends all the others
+                try:
+                    self.on_expire(key, reason)
+                except Exception:
+                    logger.exception("Ending quiz %s (%s) failed", key, reason)
+
+            if self.on_tick and now >= next_tick:
+                next_tick = now + self.tick_interval
+                with self.lock:
+                    deadlines = [(key, quiz['deadline']) for key, quiz in self.quizzes.items()
+                                 if quiz['deadline'] is not None]
+                for key, deadline in deadlines:
+                    try:
+                        self.on_tick(key, max(0.0, deadline - now))
+                    except Exception:
+                        logger.exception("Time update for quiz %s failed", key)
+
+            with self.lock:
+                next_due = self.heap[0][0] if self.heap else next_tick
+            self.socketio.sleep(max(0.0, min(next_due, next_tick) - time.time()))
+
+    def stats(self):
+        with self.lock:
+            return {'tracked': len(self.quizzes), 'heap': len(self.heap),
+                    'expired_time_up': self.expired['time_up'],
+                    'expired_abandoned': self.expired['abandoned']}
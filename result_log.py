@@ -0,0 +1,276 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+
+# Write-behind persistence for final quiz results. /end_game appends the
+# result to a local append-only log (fsync'd) and returns; a background
+# flusher writes pending results to Firebase in batches, as one multi-path
+# update per batch, retrying with backoff until it succeeds. Each flushed
+# record gets an ack line, and entries without an ack are replayed on
+# startup, so a result survives a crash or a Firebase outage.
+#
+# Every process (e.g. each gunicorn worker) writes its own
+# RESULT_LOG_PATH.<pid> and holds an exclusive lock on it while it runs. On
+# startup a process adopts the logs of processes that are gone (nobody holds
+# their lock): their pending entries are copied into its own log and the old
+# file is removed, so each result is replayed by exactly one process.
+# Results Firebase rejects outright (a 4xx other than 408/429) are moved to
+# RESULT_LOG_PATH.dead instead of blocking the ones behind them.
+RESULT_LOG_PATH = os.getenv('RESULT_LOG_PATH', 'results.log')
+RESULT_FLUSH_BATCH = int(os.getenv('RESULT_FLUSH_BATCH', '50'))
+RESULT_FLUSH_INTERVAL = float(os.getenv('RESULT_FLUSH_INTERVAL', '0.2'))
+RESULT_FLUSH_MAX_BACKOFF = float(os.getenv('RESULT_FLUSH_MAX_BACKOFF', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+def status_code(error):
+    # HTTP status behind a failed Firebase call, if any; pyrebase wraps the
+    # requests error in another HTTPError without a response
+    for candidate in (error,) + tuple(getattr(error, 'args', ())):
+        response = getattr(candidate, 'response', None)
+        if response is not None:
+            return response.status_code
+    return None
+
+
+def permanent_failure(error):
+    status = status_code(error)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def updates_for(entries):
+    updates = {}
+    for entry in entries:
+        for key, value in entry['data'].items():
+            updates[f"{entry['path']}/{key}"] = value
+    return updates
+
+
+def same_file(f, path):
+    # False once `path` was removed or replaced after `f` was opened
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def read_log(path):
+    # Returns {seq: record} of entries that were never acknowledged. A torn
+    # last line from a crash mid-append is ignored.
+    pending = {}
+    if not os.path.exists(path):
+        return pending
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'ack' in entry:
+                for seq in entry['ack']:
+                    pending.pop(seq, None)
+            else:
+                pending[entry['seq']] = entry
+    return pending
+
+
+class ResultLog:
+    def __init__(self, socketio, database, path=RESULT_LOG_PATH, batch=RESULT_FLUSH_BATCH,
+                 interval=RESULT_FLUSH_INTERVAL, on_flushed=None):
+        # `on_flushed(path)` runs after a result has reached Firebase
+        self.socketio = socketio
+        self.database = database
+        self.path = path
+        self.dead_path = path + '.dead'
+        self.batch = batch
+        self.interval = interval
+        self.on_flushed = on_flushed
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = {}
+        self.next_seq = 1
+        self.file = None
+        self.started = False
+        self.flushed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_error = None
+
+    def start(self):
+        # Opens this process's log, adopts orphaned logs and starts the flusher
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+            self._open(f"{self.path}.{os.getpid()}")
+            adopted = self._adopt()
+            if not self.pending:
+                self._truncate()
+        if self.pending:
+            logger.info("Replaying %d unflushed quiz results (%d adopted from other processes)",
+                        len(self.pending), adopted)
+            self.wakeup.set()
+        self.socketio.start_background_task(self._flush_loop)
+
+    def _open(self, own_path):
+        while True:
+            self.file = open(own_path, 'a+b')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            # Another process may have adopted and removed a stale log with
+            # our pid between the open and the lock
+            if same_file(self.file, own_path):
+                break
+            self.file.close()
+        self.pending = read_log(own_path)
+        self.next_seq = max(self.pending, default=0) + 1
+        # Start on a fresh line after a torn last record
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell():
+            self.file.seek(-1, os.SEEK_END)
+            if self.file.read(1) != b'\n':
+                self.file.write(b'\n')
+
+    def _adopt(self):
+        # Moves the pending entries of logs nobody holds into ours; returns
+        # how many were adopted
+        own = self.file.name
+        adopted = 0
+        for path in [self.path] + glob.glob(glob.escape(self.path) + '.*'):
+            if path == own or not (path == self.path or path[len(self.path) + 1:].isdigit()):
+                continue
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Its process is still running
+                    continue
+                if not same_file(f, path):
+                    continue
+                orphaned = read_log(path)
+                entries = []
+                for seq in sorted(orphaned):
+                    entries.append(dict(orphaned[seq], seq=self.next_seq))
+                    self.next_seq += 1
+                # Durable in our log before the orphan goes away
+                self._write(*entries)
+                self.pending.update((entry['seq'], entry) for entry in entries)
+                adopted += len(entries)
+                os.remove(path)
+        return adopted
+
+    def append(self, path, data):
+        # Durable once this returns; raises OSError if the log can't be written
+        self.start()
+        with self.lock:
+            entry = {'seq': self.next_seq, 'path': path, 'data': data, 'time': time.time()}
+            self._write(entry)
+            self.pending[entry['seq']] = entry
+            self.next_seq += 1
+        self.wakeup.set()
+        return entry['seq']
+
+    def _write(self, *records):
+        if not records:
+            return
+        self.file.write(b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _truncate(self):
+        # Nothing pending: the log starts over (it stays open and locked)
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+    def _flush(self, entries):
+        # Writes the entries as one update. If Firebase rejects the batch
+        # outright they are retried one by one to find the bad ones. Returns
+        # (flushed, [(entry, error)] to dead-letter); transient errors raise.
+        try:
+            self.database().update(updates_for(entries))
+            return entries, []
+        except Exception as e:
+            if not permanent_failure(e):
+                raise
+            if len(entries) == 1:
+                return [], [(entries[0], e)]
+        flushed, rejected = [], []
+        for entry in entries:
+            try:
+                self.database().update(updates_for([entry]))
+                flushed.append(entry)
+            except Exception as e:
+                if not permanent_failure(e):
+                    raise
+                rejected.append((entry, e))
+        return flushed, rejected
+
+    def _dead_letter(self, entry, error):
+        logger.error("Firebase rejected the result for %s, moved to %s: %s", entry['path'], self.dead_path, error)
+        with open(self.dead_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'entry': entry, 'error': str(error), 'time': time.time()}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += 1
+
+    def _flush_loop(self):
+        backoff = self.interval
+        while True:
+            self.wakeup.wait()
+            # Short pause so results ending together share one update
+            self.socketio.sleep(self.interval)
+            self.wakeup.clear()
+            with self.lock:
+                entries = [self.pending[seq] for seq in sorted(self.pending)[:self.batch]]
+            if not entries:
+                continue
+
+            try:
+                flushed, rejected = self._flush(entries)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning("Flushing %d quiz results failed, retrying in %.1fs: %s",
+                               len(entries), backoff, e)
+                self.socketio.sleep(backoff)
+                backoff = min(backoff * 2, RESULT_FLUSH_MAX_BACKOFF)
+                self.wakeup.set()
+                continue
+            backoff = self.interval
+            for entry, error in rejected:
+                self.last_error = str(error)
+                self._dead_letter(entry, error)
+
+            with self.lock:
+                self._write({'ack': [entry['seq'] for entry in entries]})
+                for entry in entries:
+                    del self.pending[entry['seq']]
+                self.flushed += len(flushed)
+                if not self.pending:
+                    self._truncate()
+                else:
+                    self.wakeup.set()
+            if self.on_flushed:
+                for entry in flushed:
+                    self.on_flushed(entry['path'])
+
+    def stats(self):
+        with self.lock:
+            oldest = min((entry['time'] for entry in self.pending.values()), default=None)
+            return {
+                'pending': len(self.pending),
+                'oldest_pending_seconds': time.time() - oldest if oldest is not None else None,
+                'flushed': self.flushed,
+                'failures': self.failures,
+                'dead_lettered': self.dead_lettered,
+                'last_error': self.last_error,
+            }
@@ -0,0 +1,14 @@
+# Socket.IO room names. Players of a quiz share quiz_room(quiz_id); the host
+# additionally joins host_room(quiz_id) for events players don't need.
+
+def quiz_room(quiz_id):
+    return f"quiz:{quiz_id}"
+
+
+def host_room(quiz_id):
+    return f"quiz:{quiz_id}:host"
+
+
+def compact_room(room):
+    # Members of `room` that negotiated the msgpack wire encoding
+    return f"{room}:msgpack"
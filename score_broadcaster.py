@@ -0,0 +1,56 @@
+import os
+import threading
+
+
+SCORE_TICK_SECONDS = float(os.getenv('SCORE_TICK_MS', '100')) / 1000
+
+
+# Collects score changes per room and emits only the changed entries once per
+# tick, so outbound traffic follows the tick rate instead of the answer rate.
+# Every batch carries a per-room sequence number so clients can detect gaps
+# and ask for a fresh snapshot.
+class ScoreBroadcaster:
+    def __init__(self, socketio, event='update-scores', interval=SCORE_TICK_SECONDS):
+        self.socketio = socketio
+        self.event = event
+        self.interval = interval
+        self.pending = {}
+        self.sequence = {}
+        self.lock = threading.Lock()
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = self.socketio.start_background_task(self._run)
+
+    def record(self, room, key, value):
+        with self.lock:
+            self.pending.setdefault(room, {})[key] = value
+        self.start()
+
+    def current_sequence(self, room):
+        return self.sequence.get(room, 0)
+
+    def queue_depth(self):
+        with self.lock:
+            return sum(len(changes) for changes in self.pending.values())
+
+    def reset(self, room):
+        with self.lock:
+            self.pending.pop(room, None)
+            self.sequence.pop(room, None)
+
+    def flush(self):
+        with self.lock:
+            batches, self.pending = self.pending, {}
+            for room in batches:
+                self.sequence[room] = self.sequence.get(room, 0) + 1
+            sequences = {room: self.sequence[room] for room in batches}
+
+        for room, changes in batches.items():
+            self.socketio.emit(self.event, {'seq': sequences[room], 'changes': changes}, to=room)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            self.flush()
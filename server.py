@@ -1,70 +1,41 @@
-import heapq
+# Must stay the first import: patches the standard library under eventlet
+import green_io
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from dotenv import load_dotenv
-import os
 import pyrebase
+from firebase_client import auth, database
+from leaderboard import Leaderboard
+from rooms import quiz_room, host_room
+from score_broadcaster import ScoreBroadcaster
+import metrics
+import logging
+from log_config import setup_logging
 
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-firebaseConfig = {
-    'apiKey': os.getenv('API_KEY'),
-    'authDomain': os.getenv('AUTH_DOMAIN'),
-    'projectId': os.getenv('PROJECT_ID'),
-    'storageBucket': os.getenv('STORAGE_BUCKET'),
-    'messagingSenderId': os.getenv('MESSAGING_SENDER_ID'),
-    'appId': os.getenv('APP_ID'),
-    'measurementId': os.getenv('MEASUREMENT_ID'),
-    'databaseURL': os.getenv('DATABASE_URL')
-}
-
-firebase = pyrebase.initialize_app(firebaseConfig)
-auth = firebase.auth()
-db = firebase.database()
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=green_io.ASYNC_MODE)
 
 quiz_state = {
+    "quiz_id": "default",
     "current_question": None,
     "questions": [],
     "participants": {},
 }
 
-class Leaderboard:
-    def __init__(self):
-        self.heap = []
-        self.candidate_map = {}
-
-    def add_candidate(self, username, score):
-        if username in self.candidate_map:
-            self.update_score(username, score)
-        else:
-            heapq.heappush(self.heap, (-score, username))
-            self.candidate_map[username] = score
-
-    def update_score(self, username, new_score):
-        old_score = self.candidate_map[username]
-        self.candidate_map[username] = new_score
-        self.heap = [(-score, name) if name != username else (-new_score, name)
-                     for score, name in self.heap]
-        heapq.heapify(self.heap)
-
-    def get_top_candidates(self, n):
-        return [(username, -score) for score, username in heapq.nlargest(n, self.heap)]
-
-    def get_all_scores(self):
-        return [(username, -score) for score, username in self.heap]
-
-    def print_leaderboard(self):
-        print("Leaderboard:")
-        top_candidates = self.get_top_candidates(len(self.heap))
-        for rank, (username, score) in enumerate(top_candidates, start=1):
-            print(f"Rank {rank}: {username} with score {score}")
-
 leaderboard = Leaderboard()
+score_broadcaster = ScoreBroadcaster(socketio)
+
+metrics.init_app(app)
+metrics.registry.gauge('quiz_participants', 'Participants in the running quiz',
+                       lambda: len(quiz_state["participants"]))
+metrics.registry.gauge('score_emit_queue_depth', 'Score changes waiting for the next broadcast tick',
+                       score_broadcaster.queue_depth)
 
 @app.route('/')
 def home():
@@ -119,7 +90,7 @@ def add_data():
         'visible user emails': users
     }
 
-    db.child('Users').child(username).push(user_data)
+    database().child('Users').child(username).push(user_data)
 
     return jsonify({'message': 'Data pushed successfully!'})
 
@@ -131,7 +102,7 @@ def read_data():
     if not username:
         return jsonify({'error': 'Missing Username'}), 400
 
-    users = db.child('Users').child(username).get()
+    users = database().child('Users').child(username).get()
     data = users.val()
 
     return jsonify({'message': 'Data fetched successfully!', 'data': data})
@@ -139,22 +110,48 @@ def read_data():
 @app.route('/start-quiz', methods=['POST'])
 def start_quiz():
     data = request.json
+    score_broadcaster.reset(quiz_room(quiz_state["quiz_id"]))
+    quiz_state["quiz_id"] = data.get("quiz_id", "default")
     quiz_state["questions"] = data.get("questions", [])
     quiz_state["current_question"] = 0
     quiz_state["participants"] = {}
-    socketio.emit('quiz-started', {"total_questions": len(quiz_state["questions"])})
+    leaderboard.clear()
+    # Every socket: players join the new quiz's room once they hear it started
+    socketio.emit('quiz-started', {"quiz_id": quiz_state["quiz_id"],
+                                   "total_questions": len(quiz_state["questions"])})
     broadcast_current_question()
     return jsonify({"message": "Quiz started successfully!"})
 
 @socketio.on('join-quiz')
+@metrics.timed_event('join-quiz')
 def handle_join(data):
     username = data.get("username")
     if username:
         quiz_state["participants"][request.sid] = {"username": username, "score": 0}
         leaderboard.add_candidate(username, 0)  # Add user with initial score of 0
+        join_room(quiz_room(quiz_state["quiz_id"]))
         emit("joined-quiz", {"message": f"Welcome {username}!"})
+        # Full snapshot once, deltas from update-scores after that
+        emit("scores-snapshot", {
+            "seq": score_broadcaster.current_sequence(quiz_room(quiz_state["quiz_id"])),
+            "scores": dict(leaderboard.candidate_map)
+        })
+        emit("participant-joined", {"username": username}, to=host_room(quiz_state["quiz_id"]))
+        send_current_question()
+
+@socketio.on('join-host')
+@metrics.timed_event('join-host')
+def handle_join_host(data=None):
+    # A host may join the rooms of the quiz it is about to start by naming it
+    quiz_id = (data or {}).get("quiz_id") if isinstance(data, dict) else None
+    quiz_id = quiz_id or quiz_state["quiz_id"]
+    join_room(quiz_room(quiz_id))
+    join_room(host_room(quiz_id))
+    if quiz_id == quiz_state["quiz_id"]:
+        send_current_question()
 
 @socketio.on('submit-answer')
+@metrics.timed_event('submit-answer')
 def handle_submit_answer(data):
     answer = data.get("answer")
     user = quiz_state["participants"].get(request.sid)
@@ -164,36 +161,72 @@ def handle_submit_answer(data):
     if answer == correct_answer:
         user["score"] += 1
         leaderboard.update_score(user["username"], user["score"])
-    emit("update-scores", quiz_state["participants"], broadcast=True)
+        # Sent as part of the next coalesced update-scores batch
+        score_broadcaster.record(quiz_room(quiz_state["quiz_id"]), user["username"], user["score"])
 
 @socketio.on('next-question')
+@metrics.timed_event('next-question')
 def handle_next_question():
     if quiz_state["current_question"] < len(quiz_state["questions"]) - 1:
         quiz_state["current_question"] += 1
         broadcast_current_question()
     else:
-        emit("quiz-ended", quiz_state["participants"], broadcast=True)
+        score_broadcaster.flush()
+        emit("quiz-ended", quiz_state["participants"], to=quiz_room(quiz_state["quiz_id"]))
         end_quiz()
 
+def bounded_int(value, limit):
+    # Non-negative int (or digit string) capped at limit, None if invalid
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        return None
+    return min(value, limit)
+
 @socketio.on('get-leaderboard')
-def handle_get_leaderboard():
-    top_candidates = leaderboard.get_top_candidates(5)  # Fetch top 5 candidates
-    emit("leaderboard", {"top_candidates": top_candidates}, broadcast=True)
+@metrics.timed_event('get-leaderboard')
+def handle_get_leaderboard(data=None):
+    data = data if isinstance(data, dict) else {}
+    top = bounded_int(data.get("top", 5), 100)  # Fetch top 5 candidates by default
+    around = bounded_int(data.get("around", 0), 50)
+    if top is None or around is None:
+        emit("error", {"message": "top and around should be non-negative integers."})
+        return
+    top_candidates = leaderboard.get_top_candidates(top)
+    emit("leaderboard", {"top_candidates": top_candidates}, to=quiz_room(quiz_state["quiz_id"]))
+
+    # Optional "players around me" view, sent only to the requesting player
+    user = quiz_state["participants"].get(request.sid)
+    if user and around:
+        rank, neighbours = leaderboard.get_around(user["username"], around)
+        emit("leaderboard-around", {"rank": rank, "neighbours": neighbours})
+
+def current_question():
+    index = quiz_state["current_question"]
+    if index is None or not 0 <= index < len(quiz_state["questions"]):
+        return None
+    question_data = quiz_state["questions"][index]
+    return {"question": question_data["question"], "options": question_data["options"]}
 
 def broadcast_current_question():
-    question_data = quiz_state["questions"][quiz_state["current_question"]]
-    socketio.emit("new-question", {
-        "question": question_data["question"],
-        "options": question_data["options"]
-    })
+    question = current_question()
+    if question is not None:
+        socketio.emit("new-question", question, to=quiz_room(quiz_state["quiz_id"]))
+
+def send_current_question():
+    # Late joiners (and anyone who joined before the start) catch up here
+    question = current_question()
+    if question is not None:
+        emit("new-question", question)
 
 def end_quiz():
     all_scores = leaderboard.get_all_scores()
     winner = all_scores[0] if all_scores else None
     if winner:
         winner_username, winner_score = winner
-        print(f"Winner: {winner_username} with {winner_score} points")
-    socketio.emit("quiz-over", {"final_scores": all_scores, "winner": winner}, broadcast=True)
+        logger.info("Winner: %s with %s points", winner_username, winner_score)
+    socketio.emit("quiz-over", {"final_scores": all_scores, "winner": winner},
+                  to=quiz_room(quiz_state["quiz_id"]))
 
 if __name__ == "__main__":
     socketio.run(app, debug=True)
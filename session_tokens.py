@@ -0,0 +1,100 @@
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+
+# Signed session tokens issued at /login, so authenticated calls are checked
+# locally (one HMAC) instead of going back to Firebase Auth. A short-lived
+# session token is paired with a longer-lived refresh token; refreshing
+# rotates both and revokes the old pair. Revoked session ids are kept in
+# memory until the tokens that carry them would have expired anyway.
+#
+# SESSION_SECRET must be shared by every worker; without it each process
+# signs with its own random key and tokens don't survive a restart.
+SESSION_SECRET = os.getenv('SESSION_SECRET')
+SESSION_TTL = int(os.getenv('SESSION_TTL', str(15 * 60)))
+REFRESH_TTL = int(os.getenv('REFRESH_TTL', str(30 * 24 * 3600)))
+AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', '').lower() in ('1', 'true', 'yes')
+
+logger = logging.getLogger(__name__)
+
+
+def bearer_token(header):
+    # "Bearer <token>" -> token, or None
+    scheme, _, token = (header or '').partition(' ')
+    return (token.strip() or None) if scheme.lower() == 'bearer' else None
+
+
+class SessionTokens:
+    def __init__(self, secret=SESSION_SECRET, ttl=SESSION_TTL, refresh_ttl=REFRESH_TTL):
+        if not secret:
+            logger.warning("SESSION_SECRET is not set; using a per-process key")
+            secret = secrets.token_hex(32)
+        self.sessions = URLSafeTimedSerializer(secret, salt='session')
+        self.refreshers = URLSafeTimedSerializer(secret, salt='refresh')
+        self.ttl = ttl
+        self.refresh_ttl = refresh_ttl
+        self.lock = threading.Lock()
+        self.revoked = {}
+        self.next_prune = time.time() + ttl
+
+    def issue(self, uid, email=None):
+        session_id = uuid.uuid4().hex
+        claims = {'uid': uid, 'email': email, 'sid': session_id}
+        return {
+            'session_token': self.sessions.dumps(claims),
+            'refresh_token': self.refreshers.dumps(claims),
+            'expires_in': self.ttl,
+        }
+
+    def _load(self, serializer, token, max_age):
+        try:
+            claims = serializer.loads(token, max_age=max_age)
+        except (SignatureExpired, BadSignature):
+            return None
+        if not isinstance(claims, dict) or claims.get('sid') in self.revoked:
+            return None
+        return claims
+
+    def verify(self, token):
+        # Claims dict ({'uid', 'email', 'sid'}) of a valid session token, or None
+        if not token:
+            return None
+        return self._load(self.sessions, token, self.ttl)
+
+    def refresh(self, refresh_token):
+        # New token pair for a valid refresh token, or None; the old pair is revoked
+        claims = self._load(self.refreshers, refresh_token, self.refresh_ttl) if refresh_token else None
+        if claims is None:
+            return None
+        self.revoke(claims['sid'])
+        return self.issue(claims['uid'], claims.get('email'))
+
+    def revoke(self, session_id):
+        now = time.time()
+        with self.lock:
+            self.revoked[session_id] = now + self.refresh_ttl
+            if now >= self.next_prune:
+                self.next_prune = now + self.ttl
+                for expired in [sid for sid, until in self.revoked.items() if until <= now]:
+                    del self.revoked[expired]
+
+    def revoke_token(self, token):
+        # Revokes the session a session or refresh token belongs to
+        for serializer in (self.sessions, self.refreshers):
+            try:
+                claims = serializer.loads(token)
+            except BadSignature:
+                continue
+            if isinstance(claims, dict) and 'sid' in claims:
+                self.revoke(claims['sid'])
+                return True
+        return False
+
+    def stats(self):
+        return {'revoked': len(self.revoked), 'auth_required': AUTH_REQUIRED}
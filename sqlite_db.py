@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteDatabase:
+    # One connection per process, opened lazily so it is never shared across
+    # a gunicorn fork. WAL mode lets other processes read while one writes.
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.lock = threading.RLock()
+        self.connection = None
+        self.pid = None
+
+    def connect(self):
+        if self.connection is None or self.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(self.schema)
+            self.connection = connection
+            self.pid = os.getpid()
+        return self.connection
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.connect().execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            connection = self.connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
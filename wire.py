@@ -0,0 +1,105 @@
+import os
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from rooms import compact_room
+
+
+# Opt-in compact wire protocol for quiz events.
+#
+# Server-wide: SOCKETIO_SERIALIZER=msgpack switches python-socketio's packet
+# serializer for every client. Per client: a socket that joins with
+# encoding='msgpack' gets msgpack-encoded binary payloads and short integer
+# handles for its quiz and user, and can submit answers as a packed
+# [question_index, option_index] on the 'a' event.
+ENCODINGS = ('json', 'msgpack') if msgpack is not None else ('json',)
+
+
+def socketio_options():
+    serializer = os.getenv('SOCKETIO_SERIALIZER')
+    return {'serializer': serializer} if serializer else {}
+
+
+def encode(payload, encoding):
+    return msgpack.packb(payload) if encoding == 'msgpack' else payload
+
+
+def decode(data):
+    if isinstance(data, (bytes, bytearray)):
+        if msgpack is None:
+            raise ValueError('msgpack is not installed')
+        return msgpack.unpackb(data)
+    return data
+
+
+class WireSessions:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.encodings = {}
+        self.quiz_handles = {}
+        self.quizzes = {}
+        self.user_handles = {}
+        self.sessions = {}
+        self.next_handle = 1
+
+    def negotiate(self, sid, requested):
+        encoding = requested if requested in ENCODINGS else 'json'
+        with self.lock:
+            self.encodings[sid] = encoding
+        return encoding
+
+    def encoding(self, sid):
+        return self.encodings.get(sid, 'json')
+
+    def room_for(self, sid, room):
+        # msgpack clients sit in a parallel sub-room so every room emit can be
+        # encoded once per encoding
+        return compact_room(room) if self.encoding(sid) == 'msgpack' else room
+
+    def bind(self, sid, host, quiz_id, username):
+        # Returns (quiz handle, user handle) for a joining player
+        with self.lock:
+            quiz_handle = self.quiz_handles.get((host, quiz_id))
+            if quiz_handle is None:
+                quiz_handle = self.quiz_handles[(host, quiz_id)] = self.next_handle
+                self.quizzes[quiz_handle] = (host, quiz_id)
+                self.next_handle += 1
+            user_handle = self.user_handles.get((quiz_handle, username))
+            if user_handle is None:
+                user_handle = self.user_handles[(quiz_handle, username)] = self.next_handle
+                self.next_handle += 1
+            self.sessions[sid] = (quiz_handle, user_handle, username)
+        return quiz_handle, user_handle
+
+    def session(self, sid):
+        # (host, quiz_id, username) of a bound socket, or None
+        with self.lock:
+            session = self.sessions.get(sid)
+            if session is None or session[0] not in self.quizzes:
+                return None
+            host, quiz_id = self.quizzes[session[0]]
+            return host, quiz_id, session[2]
+
+    def drop(self, sid):
+        with self.lock:
+            self.encodings.pop(sid, None)
+            self.sessions.pop(sid, None)
+
+    def release_quiz(self, host, quiz_id):
+        with self.lock:
+            quiz_handle = self.quiz_handles.pop((host, quiz_id), None)
+            if quiz_handle is None:
+                return
+            del self.quizzes[quiz_handle]
+            for key in [key for key in self.user_handles if key[0] == quiz_handle]:
+                del self.user_handles[key]
+
+
+def emit_room(socketio, event, payload, room):
+    socketio.emit(event, payload, to=room)
+    if msgpack is not None:
+        socketio.emit(event, msgpack.packb(payload), to=compact_room(room))